@@ -18,9 +18,12 @@ from sqlalchemy import text
 # ----------------------------
 # sys.path.append(r"C:\BLS\EvalAI8\Quiz")
 from Quiz.quiz_generator import generate_quiz_from_pdf
-from Quiz.saving_quiz import save_quiz, save_user_attempt, load_existing_quiz
+from Quiz.saving_quiz import save_quiz, save_user_attempt, load_existing_quiz, build_content_key
 from Quiz.qa_evaluator import evaluate_saq
 from Backend.initials import is_english_file, is_pdf_file, is_invalid_file
+from Backend.uploads import read_upload, lookup_upload, record_upload
+from TextCleaning.diagramText import warm_up_ocr
+from ModelRegistry.registry import evict_idle_models, MODEL_IDLE_SECONDS
 
 
 from   Backend.config   import  Config
@@ -109,10 +112,15 @@ def get_local_ip():
     except Exception:
         return "127.0.0.1"
 
-def make_quiz_key(pdf_list):
-    return "_".join(
-        sorted(os.path.basename(p) for p in pdf_list)
-    )
+def unique_upload_name(filename, taken):
+    """`filename`, or "name (2).pdf", "name (3).pdf"... if already in `taken`."""
+    if filename not in taken:
+        return filename
+    stem, ext = os.path.splitext(filename)
+    n = 2
+    while f"{stem} ({n}){ext}" in taken:
+        n += 1
+    return f"{stem} ({n}){ext}"
 
 
 
@@ -133,66 +141,132 @@ def upload_pdfs():
         print("request.files:", request.files)
         return jsonify({"error": "No files received"}), 400
 
-    files = list(request.files.values())
-    print("list(request.files.values())  :", files)
+    # Every file of every field (the frontend sends them all as "files")
+    files = [f for field in request.files for f in request.files.getlist(field)]
+    print("uploaded files  :", files)
     if not files:
         return jsonify({"error": "No files uploaded"}), 400
 
     pdf_paths = []
+    # Each PDF is read once, identified by its SHA-256, and parsed at most
+    # once; the parse is shared by every later stage
+    uploads = {}
+    documents = {}
+    known_clusters = {}
 
-    for file in files:
-        # 1️⃣ PDF check
-        if not is_pdf_file(file):
-            return jsonify({
-                "error": "invalid_file",
-                "message": f"File '{file.filename}' is not a valid PDF",
-                "files": [file.filename]
-            }), 200
-
-        pdf_path = os.path.join(UPLOAD_FOLDER, file.filename)
-        file.save(pdf_path)
-
-        # ✅ 1.5️⃣ Empty / corrupt PDF check (BEST placement)
-        if is_invalid_file(pdf_path):
-            return jsonify({
-                "error": "invalid_file",
-                "message": f"File '{file.filename}' is invalid",
-                "files": [file.filename]
-            }), 200
-
-        # 3️⃣ English check (using new detector class)
-        if not is_english_file(file):
-            print("❌ Non-English file detected:", file.filename)
-            return jsonify({
-                "error": "non_english_file",
-                "message": f"File '{file.filename}' is not in English",
-                "files": [file.filename]
-            }), 200
-        print("✅ English file confirmed:", file.filename)
-        pdf_paths.append(pdf_path)
-
-    # ======================================================
-    # Process ALL PDFs together → global clusters → single LLM call
-    # ======================================================
-    quiz_data = generate_quiz_from_pdf(
-        pdf_path=pdf_paths,
-        max_questions=MAX_QUESTIONS,
-        save=False
-    )
-
-    combined_quiz = quiz_data.get("quiz", [])
-
-    for idx, q in enumerate(combined_quiz):
-        if "id" not in q or not q["id"]:
-            q["id"] = f"q_{idx}"
-
-    quiz_key = make_quiz_key(pdf_paths)
-    save_quiz(quiz_key, combined_quiz)
+    try:
+        for file in files:
+            # 1️⃣ PDF check
+            if not is_pdf_file(file):
+                return jsonify({
+                    "error": "invalid_file",
+                    "message": f"File '{file.filename}' is not a valid PDF",
+                    "files": [file.filename]
+                }), 200
+
+            # Uploads stay in memory; UPLOAD_FOLDER only receives the
+            # content-addressed copy (and spools above UPLOAD_SPOOL_THRESHOLD)
+            # Keyed per upload: two different files named paper.pdf stay
+            # apart as "paper.pdf" and "paper (2).pdf"
+            pdf_path = unique_upload_name(file.filename, uploads)
+            uploads[pdf_path] = read_upload(file, spool_dir=UPLOAD_FOLDER)
+            pdf_paths.append(pdf_path)
+
+        digests = [upload.digest for upload in uploads.values()]
+        quiz_key = build_content_key(digests)
+
+        # ======================================================
+        # Known content → stored quiz, no validation / extraction / LLM
+        # ======================================================
+        cached_quiz = load_existing_quiz(pdf_paths, quiz_key=quiz_key)
+        if cached_quiz is not None:
+            print("✅ Known content, reusing stored quiz:", quiz_key)
+            combined_quiz = cached_quiz["quiz"]
+        else:
+            for pdf_path, upload in uploads.items():
+                known = lookup_upload(UPLOAD_FOLDER, upload.digest)
+
+                # Verdict already recorded for this exact content
+                if known.get("valid") is False:
+                    error = known.get("error", "invalid_file")
+                    return jsonify({
+                        "error": error,
+                        "message": f"File '{pdf_path}' is " + ("not in English" if error == "non_english_file" else "invalid"),
+                        "files": [pdf_path]
+                    }), 200
+
+                if known.get("clusters") is not None:
+                    known_clusters[pdf_path] = known["clusters"]
+                    continue
+
+                upload.store(UPLOAD_FOLDER)
+
+                try:
+                    document = upload.open()
+                except Exception as e:
+                    print("❌ Could not parse PDF:", pdf_path, e)
+                    document = None
+                else:
+                    documents[pdf_path] = document
+
+                if known.get("valid") is True and document is not None:
+                    print("✅ Validation skipped, content already accepted:", pdf_path)
+                    continue
+
+                # ✅ 1.5️⃣ Empty / corrupt PDF check (BEST placement)
+                if document is None or is_invalid_file(document):
+                    record_upload(UPLOAD_FOLDER, upload.digest, filename=upload.filename, valid=False, error="invalid_file")
+                    return jsonify({
+                        "error": "invalid_file",
+                        "message": f"File '{pdf_path}' is invalid",
+                        "files": [pdf_path]
+                    }), 200
+
+                # 3️⃣ English check (using new detector class)
+                if not is_english_file(document):
+                    print("❌ Non-English file detected:", pdf_path)
+                    record_upload(UPLOAD_FOLDER, upload.digest, filename=upload.filename, valid=False, error="non_english_file")
+                    return jsonify({
+                        "error": "non_english_file",
+                        "message": f"File '{pdf_path}' is not in English",
+                        "files": [pdf_path]
+                    }), 200
+                print("✅ English file confirmed:", pdf_path)
+                record_upload(UPLOAD_FOLDER, upload.digest, filename=upload.filename, valid=True)
+
+            # ======================================================
+            # Process ALL PDFs together → global clusters → single LLM call
+            # ======================================================
+            quiz_data = generate_quiz_from_pdf(
+                pdf_path=pdf_paths,
+                max_questions=MAX_QUESTIONS,
+                save=False,
+                documents=documents,
+                clusters=known_clusters,
+                quiz_key=quiz_key
+            )
+
+            for pdf_path, clusters in quiz_data.get("clusters", {}).items():
+                record_upload(UPLOAD_FOLDER, uploads[pdf_path].digest, filename=uploads[pdf_path].filename, clusters=clusters)
+
+            combined_quiz = quiz_data.get("quiz", [])
+
+            for idx, q in enumerate(combined_quiz):
+                if "id" not in q or not q["id"]:
+                    q["id"] = f"q_{idx}"
+
+            save_quiz(pdf_paths, combined_quiz, quiz_key=quiz_key)
+    finally:
+        for document in documents.values():
+            document.close()
+        for upload in uploads.values():
+            upload.discard()
 
     return jsonify({
         "total_questions": len(combined_quiz),
         "mcq_count": sum(1 for q in combined_quiz if q["type"] == "MCQ"),
         "saq_count": sum(1 for q in combined_quiz if q["type"] == "SAQ"),
+        "document_ids": digests,
         "quiz": combined_quiz
     })
 
@@ -207,17 +281,23 @@ def submit_quiz():
         print("Received data:", data)
 
         pdf_names = data.get("pdf_names")
+        # SHA-256 ids returned by /upload_pdfs/: the quiz is looked up by
+        # content, never by file name (names are shared between users)
+        document_ids = data.get("document_ids")
         mcq_answers = data.get("mcq_answers", {})
         saq_answers = data.get("saq_answers", {})
         user_id = str(uuid.uuid4())
 
+        if not document_ids:
+            return jsonify({"error": "Missing document_ids"}), 400
         if not pdf_names:
-            return jsonify({"error": "Missing pdf_names"}), 400
+            pdf_names = document_ids
 
         # --------------------------------------------------
-        # Load saved quiz (PASS PDF NAMES, NOT KEY)
+        # Load saved quiz by content key
         # --------------------------------------------------
-        saved_quiz_data = load_existing_quiz(pdf_names)
+        quiz_key = build_content_key(document_ids)
+        saved_quiz_data = load_existing_quiz(pdf_names, quiz_key=quiz_key)
         print("entering if else block for saved quiz data")
         if not saved_quiz_data or not saved_quiz_data.get("quiz"):
             print("❌ Saved quiz not found or empty for PDFs:", saved_quiz_data)
@@ -560,6 +640,16 @@ def process_candidate_eval():
 # ----------------- Scheduler Setup -----------------
 scheduler = BackgroundScheduler()
 scheduler.add_job(func=process_candidate_eval, trigger="interval", minutes=3)
+# OCR_WARMUP=1 loads the OCR models once at start-up (in the background)
+# instead of on the first upload that contains a diagram
+if os.getenv("OCR_WARMUP", "0") == "1":
+    scheduler.add_job(func=warm_up_ocr)
+# MODEL_IDLE_SECONDS > 0 frees models (spaCy, MiniLM, EasyOCR, ...) left
+# unused that long; the next request that needs one reloads it
+if MODEL_IDLE_SECONDS > 0:
+    scheduler.add_job(
+        func=evict_idle_models, trigger="interval", seconds=max(60, MODEL_IDLE_SECONDS // 4)
+    )
 scheduler.start()
 
 
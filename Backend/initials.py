@@ -1,116 +1,115 @@
 # from langdetect import detect, LangDetectException
-from PyPDF2 import PdfReader
-import pdfplumber
 import os
 import re
 from Backend.languageCheck import EnglishLanguageDetector
+from TextCleaning.document import ParsedDocument, open_document
 
-def is_english_file(file):
+# Validation needs at least this many Latin letters (or one image) ...
+MIN_ALPHA_CHARS = 50
+# ... found within the first N pages; the scan stops as soon as either is seen
+VALIDATION_PAGE_BUDGET = int(os.getenv("VALIDATION_PAGE_BUDGET", "50"))
+
+NON_ALPHA_RE = re.compile(r"[^A-Za-z]")
+
+def is_english_file(source):
     """
     Check if uploaded PDF file contains predominantly English text.
     Intelligently samples pages from the middle to avoid front matter bias.
     Image-based PDFs are automatically accepted (no language check needed).
     
     Args:
-        file: FileStorage object from Flask request
+        source: ParsedDocument shared with the rest of the pipeline (or a PDF path)
         
     Returns:
         bool: True if file is in English or image-based, False otherwise
     """
+    filename = source.name if isinstance(source, ParsedDocument) else os.path.basename(str(source))
     try:
-        # Save current position
-        file.seek(0)
-        
-        # Read PDF content
-        pdf_reader = PdfReader(file)
-        total_pages = len(pdf_reader.pages)
-        text = ""
-        image_found = False
+        with open_document(source) as document:
+            total_pages = document.page_count
+            text = ""
+            image_found = False
         
-        print(f"📚 Analyzing PDF: {file.filename} ({total_pages} pages)")
+            print(f"📚 Analyzing PDF: {document.name} ({total_pages} pages)")
         
-        # Strategy: Sample pages based on document length
-        if total_pages == 1:
-            # Single page document - check that page
-            pages_to_check = [0]
-            print("   Strategy: Single page document")
+            # Strategy: Sample pages based on document length
+            if total_pages == 1:
+                # Single page document - check that page
+                pages_to_check = [0]
+                print("   Strategy: Single page document")
             
-        elif total_pages == 2:
-            # Two page document - check both pages
-            pages_to_check = [0, 1]
-            print("   Strategy: Checking both pages")
+            elif total_pages == 2:
+                # Two page document - check both pages
+                pages_to_check = [0, 1]
+                print("   Strategy: Checking both pages")
             
-        elif total_pages <= 10:
-            # Short document (3-10 pages) - check middle pages
-            # Skip first page (likely title/intro), check 2-3 middle pages
-            start_idx = 1
-            end_idx = min(total_pages, 4)
-            pages_to_check = list(range(start_idx, end_idx))
-            print(f"   Strategy: Short doc - checking pages {pages_to_check}")
+            elif total_pages <= 10:
+                # Short document (3-10 pages) - check middle pages
+                # Skip first page (likely title/intro), check 2-3 middle pages
+                start_idx = 1
+                end_idx = min(total_pages, 4)
+                pages_to_check = list(range(start_idx, end_idx))
+                print(f"   Strategy: Short doc - checking pages {pages_to_check}")
             
-        else:
-            # Long document (11+ pages) - sample from middle third
-            # This avoids: intro, TOC, abstract, index, references
-            middle_start = total_pages // 3
-            middle_end = (total_pages * 2) // 3
+            else:
+                # Long document (11+ pages) - sample from middle third
+                # This avoids: intro, TOC, abstract, index, references
+                middle_start = total_pages // 3
+                middle_end = (total_pages * 2) // 3
             
-            # Select 3 pages from the middle section
-            pages_to_check = [
-                middle_start,
-                (middle_start + middle_end) // 2,
-                middle_end - 1
-            ]
-            print(f"   Strategy: Long doc - sampling middle pages {pages_to_check} (from middle third)")
+                # Select 3 pages from the middle section
+                pages_to_check = [
+                    middle_start,
+                    (middle_start + middle_end) // 2,
+                    middle_end - 1
+                ]
+                print(f"   Strategy: Long doc - sampling middle pages {pages_to_check} (from middle third)")
         
-        # Extract text from selected pages and check for images
-        with pdfplumber.open(file) as pdf:
+            # Extract text from selected pages and check for images
             for page_num in pages_to_check:
-                if page_num < len(pdf.pages):
-                    page = pdf.pages[page_num]
-                    page_text = page.extract_text() or ""
+                if page_num < total_pages:
+                    page_text = document.page_text(page_num) or ""
                     text += page_text
                     print(f"   Page {page_num + 1}: {len(page_text)} characters extracted")
-                    
+                
                     # Check if page has images (scanned/image-based content)
-                    if page.images:
+                    page_images = document.page_images(page_num)
+                    if page_images:
                         image_found = True
-                        print(f"   Page {page_num + 1}: Contains {len(page.images)} image(s)")
-        
-        # Reset file pointer
-        file.seek(0)
+                        print(f"   Page {page_num + 1}: Contains {len(page_images)} image(s)")
         
-        # If no text extracted, check if it's an image-based document
-        if not text.strip():
-            if image_found:
-                print(f"✅ Image-based PDF detected (no text): {file.filename}")
-                print(f"   Result: ACCEPTED (image-only document)\n")
-                return True  # Accept image-only PDFs
-            else:
-                print(f"⚠️ No text or images extracted from PDF: {file.filename}")
-                return False
+            # If no text extracted, check if it's an image-based document
+            if not text.strip():
+                if image_found:
+                    print(f"✅ Image-based PDF detected (no text): {filename}")
+                    print(f"   Result: ACCEPTED (image-only document)\n")
+                    return True  # Accept image-only PDFs
+                else:
+                    print(f"⚠️ No text or images extracted from PDF: {filename}")
+                    return False
         
-        print(f"   Total text extracted: {len(text)} characters")
+            print(f"   Total text extracted: {len(text)} characters")
         
-        # Use the detector class
-        detector = EnglishLanguageDetector(
-            english_threshold=0.80,
-            max_non_english_ratio=0.20
-        )
+            # Use the detector class
+            detector = EnglishLanguageDetector(
+                english_threshold=0.80,
+                max_non_english_ratio=0.20
+            )
         
-        is_english, stats = detector.detect(text, verbose=True)
+            is_english, stats = detector.detect(text, verbose=True)
         
-        # Log detection results
-        print(f"\n📊 Language Detection Results:")
-        print(f"   English Ratio: {stats.get('english_ratio', 0):.1%}")
-        print(f"   Non-English Ratio: {stats.get('non_english_ratio', 0):.1%}")
-        print(f"   English chars: {stats.get('english_letters', 0)}")
-        print(f"   Non-English chars: {stats.get('non_english_chars', 0)}")
-        print(f"   Result: {'✅ ACCEPTED' if is_english else '❌ REJECTED'}\n")
+            # Log detection results
+            print(f"\n📊 Language Detection Results:")
+            print(f"   English Ratio: {stats.get('english_ratio', 0):.1%}")
+            print(f"   Non-English Ratio: {stats.get('non_english_ratio', 0):.1%}")
+            print(f"   English chars: {stats.get('english_letters', 0)}")
+            print(f"   Non-English chars: {stats.get('non_english_chars', 0)}")
+            print(f"   Result: {'✅ ACCEPTED' if is_english else '❌ REJECTED'}\n")
         
-        return is_english
+            return is_english
         
     except Exception as e:
-        print(f"❌ Error checking language for {file.filename}: {e}")
+        print(f"❌ Error checking language for {filename}: {e}")
         # Fail-safe: accept the document if error occurs
         return True
     
@@ -139,7 +138,39 @@ def is_pdf_file(file):
 
     return True
 
-def is_invalid_file(file_path: str) -> bool:
+def has_meaningful_content(document, min_alpha_chars: int = MIN_ALPHA_CHARS, page_budget: int = None) -> bool:
+    """
+    Early-exit content check on a ParsedDocument.
+
+    Walks pages in order and stops as soon as it has seen one image
+    (scanned PDFs are valid) or `min_alpha_chars` Latin letters.
+    Only the first `page_budget` pages are inspected
+    (VALIDATION_PAGE_BUDGET by default, 0 = no limit).
+    Text read here stays cached on the document for the cleaning stage.
+    """
+    if page_budget is None:
+        page_budget = VALIDATION_PAGE_BUDGET
+
+    pages_to_scan = document.page_count
+    if page_budget > 0:
+        pages_to_scan = min(pages_to_scan, page_budget)
+
+    total_alpha_chars = 0
+    for page_index in range(pages_to_scan):
+        # IMAGES first: listing xrefs is cheaper than text extraction
+        if document.page_images(page_index):
+            return True
+
+        # TEXT (real content)
+        text = document.page_text(page_index)
+        if text:
+            total_alpha_chars += len(NON_ALPHA_RE.sub("", text))
+            if total_alpha_chars >= min_alpha_chars:
+                return True
+
+    return False
+
+def is_invalid_file(source, page_budget: int = None) -> bool:
     """
     INVALID if:
     - missing
@@ -149,56 +180,44 @@ def is_invalid_file(file_path: str) -> bool:
     - PDF with:
         - no meaningful text AND
         - no images
+      within the first `page_budget` pages (see has_meaningful_content)
     Vector-only PDFs are treated as EMPTY.
+
+    `source` is a PDF path or the ParsedDocument shared with the pipeline.
     """
 
     try:
-        # 1️⃣ File existence
-        if not os.path.exists(file_path):
-            return True
-
-        # 2️⃣ Zero-byte
-        if os.path.getsize(file_path) == 0:
-            return True
-
-        # 3️⃣ Binary read test
-        with open(file_path, "rb") as f:
-            f.read(1)
-
-        # 4️⃣ PDF validation
-        if file_path.lower().endswith(".pdf"):
-            reader = PdfReader(file_path)
+        file_path = source.path if isinstance(source, ParsedDocument) else source
 
-            if reader.is_encrypted:
+        if file_path is not None:
+            # 1️⃣ File existence
+            if not os.path.exists(file_path):
                 return True
 
-            if len(reader.pages) == 0:
+            # 2️⃣ Zero-byte
+            if os.path.getsize(file_path) == 0:
                 return True
 
-            total_alpha_chars = 0
-            image_found = False
+            # 3️⃣ Binary read test
+            with open(file_path, "rb") as f:
+                f.read(1)
 
-            with pdfplumber.open(file_path) as pdf:
-                for page in pdf.pages:
-                    # TEXT (real content)
-                    text = page.extract_text()
-                    if text:
-                        cleaned = re.sub(r"[^A-Za-z]", "", text)
-                        total_alpha_chars += len(cleaned)
+            if not file_path.lower().endswith(".pdf"):
+                return False
 
-                    # IMAGES (scanned PDFs)
-                    if page.images:
-                        image_found = True
+        # 4️⃣ PDF validation
+        with open_document(source) as document:
+            if document.is_encrypted:
+                return True
 
-            # ✅ Image-only scanned PDFs are VALID
-            if image_found and total_alpha_chars == 0:
-                return False
+            if document.page_count == 0:
+                return True
 
             # ❌ No text AND no images → EMPTY PDF (vector-only, blank, layout junk)
-            if total_alpha_chars < 50:
+            if not has_meaningful_content(document, page_budget=page_budget):
                 return True
 
     except Exception:
         return True
 
-    return False
\ No newline at end of file
+    return False
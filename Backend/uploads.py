@@ -0,0 +1,227 @@
+"""
+uploads.py
+----------
+Turns an uploaded FileStorage into a ParsedDocument without the
+save-then-reopen round trip: the request stream is read exactly once and
+the same buffer is handed to every pipeline stage.
+
+Uploads are content-addressed: each one is identified by the SHA-256 of
+its bytes, stored once as <UPLOAD_FOLDER>/<digest>.pdf, and described in
+a small SQLite index (digest -> artifacts such as the validation verdict
+and keyword clusters) so a known document can skip the pipeline. Each
+record is one row updated in its own transaction, so web processes
+writing at the same time never lose each other's entries.
+"""
+
+import datetime
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+
+from TextCleaning.document import ParsedDocument
+
+# Uploads up to this size are parsed straight from memory; larger ones
+# spill to a temporary file so a huge thesis does not pin worker RAM.
+UPLOAD_SPOOL_THRESHOLD = int(os.getenv("UPLOAD_SPOOL_THRESHOLD", str(64 * 1024 * 1024)))
+
+UPLOAD_INDEX_NAME = "index.sqlite3"
+# JSON index used before the SQLite one; imported once, then renamed
+_LEGACY_INDEX_NAME = "index.json"
+_COPY_BLOCK = 1024 * 1024
+
+_INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS uploads (
+    digest    TEXT PRIMARY KEY,
+    artifacts TEXT NOT NULL
+)
+"""
+
+# One connection per (thread, store directory)
+_local = threading.local()
+
+
+class Upload:
+    """An uploaded PDF read once: its bytes (or spooled file) plus its SHA-256."""
+
+    def __init__(self, filename: str, digest: str, data: bytes = None, path: str = None,
+                 is_temporary: bool = False):
+        self.filename = filename
+        self.digest = digest
+        self.data = data
+        self.path = path
+        self.is_temporary = is_temporary
+
+    def open(self) -> ParsedDocument:
+        """Parses the upload; raises whatever fitz raises for corrupt content."""
+        if self.data is not None:
+            return ParsedDocument(stream=self.data, name=self.filename, digest=self.digest)
+
+        # The document takes ownership of a spooled temp file
+        document = ParsedDocument(path=self.path, name=self.filename, digest=self.digest,
+                                  delete_on_close=self.is_temporary)
+        self.is_temporary = False
+        return document
+
+    def store(self, store_dir: str) -> str:
+        """
+        Keeps one copy of the content under <store_dir>/<digest>.pdf.
+        Nothing is written when that digest is already stored.
+        """
+        store_path = stored_upload_path(store_dir, self.digest)
+
+        if self.data is not None:
+            if not os.path.exists(store_path):
+                _atomic_write(store_path, self.data)
+        elif self.is_temporary:
+            # Spooled file becomes the stored copy (same directory → rename)
+            if os.path.exists(store_path):
+                os.remove(self.path)
+            else:
+                os.replace(self.path, store_path)
+            self.path = store_path
+            self.is_temporary = False
+
+        return store_path
+
+    def discard(self):
+        """Removes a spooled temp file that was never opened or stored."""
+        if self.is_temporary and self.path and os.path.exists(self.path):
+            os.remove(self.path)
+        self.is_temporary = False
+
+
+def read_upload(file, spool_dir: str = None, spool_threshold: int = None) -> Upload:
+    """
+    Reads an uploaded PDF exactly once and hashes it on the way.
+
+    Args:
+        file: Werkzeug FileStorage object (request.files['file'])
+        spool_dir: Directory for the temporary file used above the threshold
+        spool_threshold: Max bytes kept in memory (UPLOAD_SPOOL_THRESHOLD by default)
+
+    Returns:
+        Upload holding the in-memory bytes, or a temporary file that is
+        deleted when the parsed document is closed (unless stored first).
+    """
+    if spool_threshold is None:
+        spool_threshold = UPLOAD_SPOOL_THRESHOLD
+
+    stream = file.stream
+    stream.seek(0)
+
+    # One read, one buffer: fitz and pdfplumber both open it directly
+    data = stream.read(spool_threshold + 1)
+    if len(data) <= spool_threshold:
+        return Upload(file.filename, hashlib.sha256(data).hexdigest(), data=data)
+
+    # Above the threshold: spill what was read plus the rest to disk
+    sha = hashlib.sha256(data)
+    fd, temp_path = tempfile.mkstemp(suffix=".pdf", dir=spool_dir)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            del data
+            for block in iter(lambda: stream.read(_COPY_BLOCK), b""):
+                sha.update(block)
+                f.write(block)
+    except Exception:
+        os.remove(temp_path)
+        raise
+
+    return Upload(file.filename, sha.hexdigest(), path=temp_path, is_temporary=True)
+
+
+# ============================================================
+# Content-addressed store + digest → artifacts index
+# ============================================================
+def stored_upload_path(store_dir: str, digest: str) -> str:
+    return os.path.join(store_dir, f"{digest}.pdf")
+
+
+def _atomic_write(path: str, data: bytes):
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+def _index_path(store_dir: str) -> str:
+    return os.path.join(store_dir, UPLOAD_INDEX_NAME)
+
+
+def _index_connection(store_dir: str) -> sqlite3.Connection:
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+
+    conn = connections.get(store_dir)
+    if conn is None:
+        os.makedirs(store_dir, exist_ok=True)
+        conn = sqlite3.connect(_index_path(store_dir), timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        with conn:
+            conn.execute(_INDEX_SCHEMA)
+        _import_legacy_index(store_dir, conn)
+        connections[store_dir] = conn
+    return conn
+
+
+def _import_legacy_index(store_dir: str, conn: sqlite3.Connection):
+    """Moves the entries of an old index.json into the SQLite index."""
+    path = os.path.join(store_dir, _LEGACY_INDEX_NAME)
+    if not os.path.exists(path):
+        return
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Old upload index unreadable, not imported: {e}")
+        return
+
+    with conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO uploads (digest, artifacts) VALUES (?, ?)",
+            [(digest, json.dumps(entry, ensure_ascii=False)) for digest, entry in index.items()],
+        )
+    try:
+        os.replace(path, path + ".imported")
+    except OSError:
+        pass  # Another process imported it first
+
+
+def lookup_upload(store_dir: str, digest: str) -> dict:
+    """Returns the artifacts recorded for `digest` (empty dict if unknown)."""
+    row = _index_connection(store_dir).execute(
+        "SELECT artifacts FROM uploads WHERE digest = ?", (digest,)
+    ).fetchone()
+    return json.loads(row[0]) if row else {}
+
+
+def record_upload(store_dir: str, digest: str, **artifacts) -> dict:
+    """
+    Merges `artifacts` (e.g. filename, valid, clusters) into the index
+    entry for `digest` and returns the updated entry.
+    """
+    conn = _index_connection(store_dir)
+    # IMMEDIATE: the read-merge-write of this entry is atomic across processes
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute(
+            "SELECT artifacts FROM uploads WHERE digest = ?", (digest,)
+        ).fetchone()
+        entry = json.loads(row[0]) if row else {}
+        entry.update(artifacts)
+        entry["updated_at"] = datetime.datetime.now().isoformat()
+
+        conn.execute(
+            "INSERT OR REPLACE INTO uploads (digest, artifacts) VALUES (?, ?)",
+            (digest, json.dumps(entry, ensure_ascii=False)),
+        )
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return entry
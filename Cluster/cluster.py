@@ -1,24 +1,29 @@
 import numpy as np
 from sklearn.metrics import silhouette_score
 from sklearn.cluster import KMeans
-from sentence_transformers import SentenceTransformer
 import matplotlib.pyplot as plt
 
 # Add path to context extraction folder
 # sys.path.append(r"C:\BLS\EvalAI8\Context Extraction")
 from ContextExtraction.keyword_filter import get_filtered_keywords_from_pdf
+# Embeddings shared with keyword filtering (cached per phrase)
+from ModelRegistry.embedding_cache import encode_phrases
 
-# Load embedding model
-embedding_model = SentenceTransformer("all-MiniLM-L6-v2")
-
-def get_clusters(pdf_path, max_clusters=8, use_elbow=True):
+def get_clusters(pdf_path, max_clusters=8, use_elbow=True, keywords=None, embeddings=None):
     """
     Cluster filtered keywords using K-Means with silhouette score or elbow method.
     Expects keywords already filtered. Handles small keyword sets.
+    Pass `keywords` and their `embeddings` (as returned by
+    get_filtered_keywords_from_pdf(..., with_embeddings=True)) to skip
+    extraction; otherwise both come from `pdf_path`.
     """
 
-    # Step 1: Get filtered keywords (already cleaned and filtered)
-    filtered_keywords = get_filtered_keywords_from_pdf(pdf_path)
+    # Step 1: Get filtered keywords (already cleaned and filtered) and the
+    # embeddings computed while filtering them
+    if keywords is None:
+        filtered_keywords, embeddings = get_filtered_keywords_from_pdf(pdf_path, with_embeddings=True)
+    else:
+        filtered_keywords = keywords
 
     if not filtered_keywords:
         print("No keywords found after filtering.")
@@ -33,8 +38,9 @@ def get_clusters(pdf_path, max_clusters=8, use_elbow=True):
         print("Not enough keywords to cluster. Returning all keywords as one cluster.")
         return {"Theme_1": filtered_keywords}
 
-    # Step 3: Generate embeddings
-    embeddings = embedding_model.encode(filtered_keywords)
+    # Step 3: Embeddings (encoded only when the caller has none)
+    if embeddings is None or len(embeddings) != len(filtered_keywords):
+        embeddings = encode_phrases(filtered_keywords)
     X = embeddings
 
     # Step 4: Determine optimal clusters
@@ -2,24 +2,18 @@
 # keyword_filter.py  (FINAL – AGGRESSIVE & EFFECTIVE)
 # ======================================================
 
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
-from spellchecker import SpellChecker
-import nltk
-from nltk.corpus import stopwords
-import spacy
+import numpy as np
+import os
 import re
+import threading
 
 # ------------------------------------------------------
 # SETUP
 # ------------------------------------------------------
-nltk.download("stopwords")
-STOPWORDS = set(stopwords.words("english"))
-
-spell = SpellChecker()
-nlp = spacy.load("en_core_web_sm")
-model = SentenceTransformer("all-MiniLM-L6-v2")
-
+# spaCy, MiniLM, the spell checker and the NLTK stopwords are shared
+# through the model registry (loaded from the local model cache)
+from ModelRegistry.registry import get_model, SPACY_MODEL, SPELL_CHECKER, STOPWORD_SET
+from ModelRegistry.embedding_cache import encode_phrases, embedding_cache_stats
 from ContextExtraction.keywords_text import extract_keywords_from_pdf
 
 # ------------------------------------------------------
@@ -33,11 +27,70 @@ MIN_WORD_LEN = 3
 MAX_WORDS_IN_PHRASE = 4
 SPELL_RATIO_THRESHOLD = 0.6   # 60% of words must be real
 
+WORD_RE = re.compile(r"[a-z]{3,}")
+
+# POS tags come from the tagger (on its tok2vec) mapped by the attribute
+# ruler; nothing else in the pipeline is needed for the noun check
+POS_CHECK_DISABLED = ("parser", "ner", "lemmatizer", "senter")
+POS_BATCH_SIZE = 256
+
+# Phrase -> sanity verdict, kept across documents (oldest dropped first)
+PHRASE_MEMO_SIZE = int(os.getenv("PHRASE_MEMO_SIZE", "200000"))
+_phrase_memo = {}
+_phrase_memo_lock = threading.Lock()
+
+# Candidates compared against the kept phrases per matrix product
+DEDUP_BLOCK = int(os.getenv("DEDUP_BLOCK", "256"))
+
 # ======================================================
 # CORE SANITY CHECK (THIS IS THE KEY FIX)
 # ======================================================
 def is_sane_phrase(phrase: str) -> bool:
-    words = phrase.split()
+    return phrase in sane_phrases([phrase])
+
+
+def sane_phrases(phrases) -> set:
+    """
+    The phrases of `phrases` that pass the sanity checks (see
+    _passes_word_checks and the noun check below).
+
+    Verdicts are memoised across documents; phrases not seen before that
+    pass the cheap word checks are POS-tagged together in one nlp.pipe
+    batch instead of one nlp() call each.
+    """
+    verdicts = {}
+    with _phrase_memo_lock:
+        for phrase in phrases:
+            if phrase in _phrase_memo:
+                verdicts[phrase] = _phrase_memo[phrase]
+
+    new = [p for p in dict.fromkeys(phrases) if p not in verdicts]
+    to_tag = []
+    for phrase in new:
+        if _passes_word_checks(phrase.split()):
+            to_tag.append(phrase)
+        else:
+            verdicts[phrase] = False
+
+    # 4. POS check → must contain NOUN
+    if to_tag:
+        nlp = get_model(SPACY_MODEL)
+        disabled = [name for name in POS_CHECK_DISABLED if name in nlp.pipe_names]
+        docs = nlp.pipe(to_tag, disable=disabled, batch_size=POS_BATCH_SIZE)
+        for phrase, doc in zip(to_tag, docs):
+            verdicts[phrase] = any(tok.pos_ in ("NOUN", "PROPN") for tok in doc)
+
+    if new:
+        with _phrase_memo_lock:
+            for phrase in new:
+                _phrase_memo[phrase] = verdicts[phrase]
+            while len(_phrase_memo) > PHRASE_MEMO_SIZE:
+                del _phrase_memo[next(iter(_phrase_memo))]
+
+    return {phrase for phrase, sane in verdicts.items() if sane}
+
+
+def _passes_word_checks(words) -> bool:
     if not words:
         return False
 
@@ -47,29 +100,31 @@ def is_sane_phrase(phrase: str) -> bool:
 
     # 2. Reject malformed tokens (trainingdata, abc123, ctr)
     for w in words:
-        if not re.fullmatch(r"[a-z]{3,}", w):
+        if not WORD_RE.fullmatch(w):
             return False
 
     # 3. Spell-check majority of words
+    spell = get_model(SPELL_CHECKER)
     correct = sum(1 for w in words if w in spell)
     if (correct / len(words)) < SPELL_RATIO_THRESHOLD:
         return False
 
-    # 4. POS check → must contain NOUN
-    doc = nlp(phrase)
-    if not any(tok.pos_ in ("NOUN", "PROPN") for tok in doc):
-        return False
-
     return True
 
 # ======================================================
 # FILTER FUNCTION
 # ======================================================
 def filter_keywords(keywords, threshold):
+    """
+    Cleaned, sane, semantically deduplicated phrases of `keywords`
+    ((phrase, score) pairs, best first), and their MiniLM embeddings
+    (one row per kept phrase) for the clustering stage.
+    """
     if not keywords:
-        return []
+        return [], _no_embeddings()
 
-    candidates = []
+    phrases = []
+    stop_words = get_model(STOPWORD_SET)
 
     # -----------------------------
     # CLEAN + SANITY FILTER
@@ -81,21 +136,20 @@ def filter_keywords(keywords, threshold):
 
         tokens = [
             w for w in kw.split()
-            if w not in STOPWORDS and len(w) >= MIN_WORD_LEN
+            if w not in stop_words and len(w) >= MIN_WORD_LEN
         ]
 
         if not tokens or len(tokens) > MAX_WORDS_IN_PHRASE:
             continue
 
-        phrase = " ".join(tokens)
-
-        if not is_sane_phrase(phrase):
-            continue
+        phrases.append(" ".join(tokens))
 
-        candidates.append(phrase)
+    # All phrases are checked in one batch
+    sane = sane_phrases(phrases)
+    candidates = [phrase for phrase in phrases if phrase in sane]
 
     if not candidates:
-        return []
+        return [], _no_embeddings()
 
     # Remove exact duplicates
     candidates = list(dict.fromkeys(candidates))
@@ -103,31 +157,69 @@ def filter_keywords(keywords, threshold):
     # -----------------------------
     # SEMANTIC DEDUPLICATION
     # -----------------------------
-    embeddings = model.encode(candidates)
-    sim_matrix = cosine_similarity(embeddings)
+    embeddings = encode_phrases(candidates)
+    kept_idx = greedy_dedup(embeddings, threshold)
+    kept = [candidates[i] for i in kept_idx]
+
+    return kept, embeddings[kept_idx]
+
+
+def greedy_dedup(embeddings, threshold) -> list:
+    """
+    Indices of the rows kept by greedy semantic deduplication: in order, a
+    row is kept iff its cosine similarity to every row kept before it is
+    below `threshold` (the first row is always kept).
+
+    Candidates are taken DEDUP_BLOCK at a time: one matrix product drops
+    those too close to anything kept in earlier blocks, and the survivors
+    are settled in order against the block's own kept rows. No n x n
+    similarity matrix is built.
+    """
+    X = np.asarray(embeddings, dtype=np.float32)
+    # Unit rows, zero rows left as they are (as cosine_similarity does)
+    norms = np.linalg.norm(X, axis=1, keepdims=True)
+    X = X / np.where(norms == 0, 1, norms)
 
-    kept = []
     kept_idx = []
+    kept_vectors = np.empty_like(X)
 
-    for i, kw in enumerate(candidates):
-        if not kept:
-            kept.append(kw)
-            kept_idx.append(i)
-            continue
+    for start in range(0, len(X), DEDUP_BLOCK):
+        block = X[start:start + DEDUP_BLOCK]
+        if kept_idx:
+            sims = block @ kept_vectors[:len(kept_idx)].T
+            rows = np.flatnonzero((sims < threshold).all(axis=1))
+        else:
+            rows = np.arange(len(block))
+
+        gram = block[rows] @ block[rows].T
+        local = []
+        for a in range(len(rows)):
+            if (gram[a, local] < threshold).all():
+                local.append(a)
+
+        for a in local:
+            kept_vectors[len(kept_idx)] = block[rows[a]]
+            kept_idx.append(start + int(rows[a]))
 
-        if all(sim_matrix[i][j] < threshold for j in kept_idx):
-            kept.append(kw)
-            kept_idx.append(i)
+    return kept_idx
 
-    return kept
+
+def _no_embeddings():
+    return np.empty((0, 0), dtype=np.float32)
 
 # ======================================================
 # MAIN ENTRY
 # ======================================================
-def get_filtered_keywords_from_pdf(pdf_path):
+def get_filtered_keywords_from_pdf(pdf_path, with_embeddings=False):
+    """
+    Filtered text keywords followed by filtered diagram keywords.
+    With `with_embeddings`, returns (keywords, embeddings) instead, the
+    embeddings being the rows computed while filtering, so clustering
+    does not encode the keywords again.
+    """
     raw_keywords = extract_keywords_from_pdf(pdf_path)
     if not raw_keywords:
-        return []
+        return ([], _no_embeddings()) if with_embeddings else []
 
     text_kws = []
     diagram_kws = []
@@ -138,13 +230,25 @@ def get_filtered_keywords_from_pdf(pdf_path):
         else:
             text_kws.append((kw, score))
 
-    filtered_text = filter_keywords(text_kws, TEXT_SIM_THRESHOLD)
-    filtered_diagram = filter_keywords(diagram_kws, DIAGRAM_SIM_THRESHOLD)
+    filtered_text, text_embeddings = filter_keywords(text_kws, TEXT_SIM_THRESHOLD)
+    filtered_diagram, diagram_embeddings = filter_keywords(diagram_kws, DIAGRAM_SIM_THRESHOLD)
 
     if len(filtered_diagram) < MIN_DIAGRAM_KEYWORDS:
         filtered_diagram = [kw for kw, _ in diagram_kws[:MIN_DIAGRAM_KEYWORDS]]
+        diagram_embeddings = encode_phrases(filtered_diagram) if with_embeddings else None
+
+    stats = embedding_cache_stats()
+    print(f"[INFO] Embedding cache since start-up: {stats['memory_hits']} memory hits, "
+          f"{stats['disk_hits']} disk hits, {stats['misses']} encoded "
+          f"(hit rate {stats['hit_rate']:.1%})")
+
+    keywords = filtered_text + filtered_diagram
+    if not with_embeddings:
+        return keywords
 
-    return filtered_text + filtered_diagram
+    blocks = [block for block in (text_embeddings, diagram_embeddings) if len(block)]
+    embeddings = np.vstack(blocks) if blocks else _no_embeddings()
+    return keywords, embeddings
 
 # ======================================================
 # TEST
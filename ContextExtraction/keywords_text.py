@@ -1,6 +1,6 @@
 # keyword_extractor/context.py
 
-import spacy
+import os
 from collections import Counter
 
 # --------------------------------------------------
@@ -9,11 +9,8 @@ from collections import Counter
 from TextCleaning.textCleaner import extract_clean_text
 from TextCleaning.diagramText import extract_from_pdf
 from TextCleaning.table import extract_meaningful_tables
-
-# --------------------------------------------------
-# NLP MODEL
-# --------------------------------------------------
-nlp = spacy.load("en_core_web_sm")
+from TextCleaning.document import open_document
+from ModelRegistry.registry import get_model, SPACY_MODEL
 
 # --------------------------------------------------
 # CONFIG
@@ -24,38 +21,88 @@ DIAGRAM_TOP_N = 20
 MIN_PHRASE_LEN = 2        # minimum words in phrase
 MAX_PHRASE_LEN = 5        # safety cap
 
+# noun_chunks reads POS tags and the dependency parse only
+NOUN_CHUNK_DISABLED = ("ner", "lemmatizer")
+# Text is parsed in chunks of whole paragraphs up to this many characters,
+# well under spaCy's max_length (1,000,000); shorter texts stay one chunk
+NLP_CHUNK_CHARS = int(os.getenv("NLP_CHUNK_CHARS", "100000"))
+# Processes for nlp.pipe (1 = in process; each extra one copies the model)
+NLP_PROCESSES = int(os.getenv("NLP_PROCESSES", "1"))
+
 # --------------------------------------------------
 # HELPERS
 # --------------------------------------------------
 def extract_noun_phrases(text: str):
     """
     Extract clean noun phrases from text.
+    Runs only the pipes noun_chunks needs, over paragraph chunks of the
+    text (see paragraph_chunks), so theses longer than spaCy's max_length
+    are parsed too.
     """
-    doc = nlp(text)
+    nlp = get_model(SPACY_MODEL)
+    disabled = [name for name in NOUN_CHUNK_DISABLED if name in nlp.pipe_names]
+    docs = nlp.pipe(
+        paragraph_chunks(text, NLP_CHUNK_CHARS),
+        disable=disabled, batch_size=4, n_process=NLP_PROCESSES
+    )
     phrases = []
 
-    for chunk in doc.noun_chunks:
-        phrase = chunk.text.lower().strip()
+    for doc in docs:
+        for chunk in doc.noun_chunks:
+            phrase = chunk.text.lower().strip()
 
-        words = phrase.split()
+            words = phrase.split()
 
-        # length constraints
-        if len(words) < MIN_PHRASE_LEN or len(words) > MAX_PHRASE_LEN:
-            continue
+            # length constraints
+            if len(words) < MIN_PHRASE_LEN or len(words) > MAX_PHRASE_LEN:
+                continue
 
-        # must contain a noun/proper noun
-        if not any(tok.pos_ in ("NOUN", "PROPN") for tok in chunk):
-            continue
+            # must contain a noun/proper noun
+            if not any(tok.pos_ in ("NOUN", "PROPN") for tok in chunk):
+                continue
 
-        # remove phrases starting or ending with stopwords
-        if chunk[0].is_stop or chunk[-1].is_stop:
-            continue
+            # remove phrases starting or ending with stopwords
+            if chunk[0].is_stop or chunk[-1].is_stop:
+                continue
 
-        phrases.append(phrase)
+            phrases.append(phrase)
 
     return phrases
 
 
+def paragraph_chunks(text: str, max_chars: int):
+    """
+    Yields `text` as chunks of whole paragraphs ("\n\n"-separated) of at
+    most `max_chars` characters; a text that fits is yielded unchanged.
+    A single paragraph longer than that is cut at spaces.
+    """
+    if len(text) <= max_chars:
+        yield text
+        return
+
+    chunk = []
+    size = 0
+    for paragraph in text.split("\n\n"):
+        while len(paragraph) > max_chars:
+            cut = paragraph.rfind(" ", 0, max_chars)
+            if cut <= 0:
+                cut = max_chars
+            if chunk:
+                yield "\n\n".join(chunk)
+                chunk, size = [], 0
+            yield paragraph[:cut]
+            paragraph = paragraph[cut:]
+
+        if chunk and size + 2 + len(paragraph) > max_chars:
+            yield "\n\n".join(chunk)
+            chunk, size = [], 0
+        size += (2 if chunk else 0) + len(paragraph)
+        chunk.append(paragraph)
+
+    if chunk:
+        yield "\n\n".join(chunk)
+
+
 def rank_phrases(phrases, top_n):
     """
     Rank phrases by frequency.
@@ -70,17 +117,23 @@ def rank_phrases(phrases, top_n):
 def extract_keywords_from_pdf(pdf_path):
     """
     Extract keywords using linguistically valid noun phrases.
+    `pdf_path` may be a path or a ParsedDocument; either way the PDF is
+    parsed once and shared by the text, table and diagram stages.
     """
+    with open_document(pdf_path) as document:
+        return _extract_keywords_from_document(document)
+
 
+def _extract_keywords_from_document(document):
     # ===============================
     # STEP 1: CLEAN TEXT
     # ===============================
-    clean_text = extract_clean_text(pdf_path) or ""
+    clean_text = extract_clean_text(document) or ""
 
     # ===============================
     # STEP 1B: TABLES
     # ===============================
-    tables_text = extract_meaningful_tables(pdf_path) or ""
+    tables_text = extract_meaningful_tables(document) or ""
 
     if tables_text.strip():
         print("\n[✓] Tables extracted and merged")
@@ -89,7 +142,7 @@ def extract_keywords_from_pdf(pdf_path):
     # ===============================
     # STEP 2: DIAGRAM OCR TEXT
     # ===============================
-    diagrams_list = extract_from_pdf(pdf_path)
+    diagrams_list = extract_from_pdf(document)
 
     if isinstance(diagrams_list, list):
         diagrams_text = "\n".join(diagrams_list)
@@ -0,0 +1,153 @@
+"""
+bootstrap.py
+------------
+Fetches every model the pipeline loads into MODEL_CACHE_DIR, so workers
+can run with MODELS_OFFLINE=1 and never reach the network:
+
+- NLTK stopwords      -> nltk_data/
+- spaCy en_core_web_sm -> en_core_web_sm/ (saved pipeline)
+- MiniLM              -> all-MiniLM-L6-v2/ (saved SentenceTransformer)
+- EasyOCR detector and English recognizer -> easyocr/
+
+The spell checker ships its dictionary inside pyspellchecker and needs
+nothing. After fetching, the models are loaded again in a fresh process
+with MODELS_OFFLINE=1, and the load time of each is reported.
+
+Usage (from the repo root, with network access):
+    python -m ModelRegistry.bootstrap
+    MODELS_OFFLINE=1 python -m ModelRegistry.bootstrap --check   # load + timings only
+
+Copy Cache/models (or MODEL_CACHE_DIR) to the air-gapped workers.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+from ModelRegistry.registry import (
+    get_model, model_path, model_stats, MODEL_CACHE_DIR, MODELS_OFFLINE,
+    SPACY_MODEL, SENTENCE_MODEL, OCR_MODEL, SPELL_CHECKER, STOPWORD_SET,
+)
+
+# In load order for --check: cheap ones first
+MODELS = (STOPWORD_SET, SPELL_CHECKER, SPACY_MODEL, SENTENCE_MODEL, OCR_MODEL)
+
+
+def _fetch_stopwords():
+    import nltk
+    if not nltk.download("stopwords", download_dir=model_path(STOPWORD_SET),
+                         quiet=True, raise_on_error=True):
+        raise RuntimeError("nltk.download('stopwords') failed")
+
+
+def _fetch_spacy():
+    import importlib
+    import spacy
+    try:
+        nlp = spacy.load("en_core_web_sm")
+    except OSError:
+        from spacy.cli import download
+        download("en_core_web_sm")
+        importlib.invalidate_caches()
+        nlp = spacy.load("en_core_web_sm")
+    nlp.to_disk(model_path(SPACY_MODEL))
+
+
+def _fetch_sentence_model():
+    from sentence_transformers import SentenceTransformer
+    SentenceTransformer("all-MiniLM-L6-v2").save(model_path(SENTENCE_MODEL))
+
+
+def _fetch_ocr_weights():
+    import easyocr
+    storage = model_path(OCR_MODEL)
+    os.makedirs(storage, exist_ok=True)
+    easyocr.Reader(['en'], gpu=False, verbose=False,
+                   model_storage_directory=storage, download_enabled=True)
+
+
+_FETCHERS = {
+    STOPWORD_SET: _fetch_stopwords,
+    SPACY_MODEL: _fetch_spacy,
+    SENTENCE_MODEL: _fetch_sentence_model,
+    OCR_MODEL: _fetch_ocr_weights,
+}
+
+
+def prefetch(names=None) -> bool:
+    """Downloads `names` (all models by default) into MODEL_CACHE_DIR; True if all succeeded."""
+    if MODELS_OFFLINE:
+        raise RuntimeError("MODELS_OFFLINE=1: unset it to fetch models")
+
+    ok = True
+    for name in names or MODELS:
+        fetch = _FETCHERS.get(name)
+        if fetch is None:
+            continue
+        start = time.perf_counter()
+        try:
+            fetch()
+        except Exception as e:
+            print(f"[ERROR] Fetching {name} failed: {e}")
+            ok = False
+            continue
+        print(f"[INFO] Fetched {name} into {model_path(name)} "
+              f"in {time.perf_counter() - start:.1f}s")
+    return ok
+
+
+def check(names=None) -> bool:
+    """
+    Loads `names` (all models by default) through the registry and prints
+    the load time and resident memory of each; True if all loaded.
+    Meant to run with MODELS_OFFLINE=1 (see main).
+    """
+    failed = []
+    for name in names or MODELS:
+        try:
+            get_model(name)
+        except Exception as e:
+            print(f"[ERROR] Loading {name} failed: {e}")
+            failed.append(name)
+
+    stats = model_stats()
+    print(f"\n{'model':<14} {'load s':>8} {'+MB':>8}  source")
+    for name in names or MODELS:
+        if name in failed:
+            print(f"{name:<14} {'-':>8} {'-':>8}  FAILED")
+            continue
+        entry = stats[name]
+        local = name in _FETCHERS and os.path.isdir(model_path(name))
+        rss = "-" if entry["resident_mb"] is None else f"{entry['resident_mb']:.0f}"
+        print(f"{name:<14} {entry['load_seconds']:8.2f} {rss:>8}  "
+              f"{model_path(name) if local else 'default location'}")
+    return not failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fetch models for offline use and time their loading")
+    parser.add_argument("--check", action="store_true",
+                        help="only load the models and report timings (set MODELS_OFFLINE=1)")
+    parser.add_argument("--models", nargs="+", choices=MODELS, help="subset of models")
+    args = parser.parse_args(argv)
+
+    if args.check:
+        return 0 if check(args.models) else 1
+
+    print(f"[INFO] Fetching models into {os.path.abspath(MODEL_CACHE_DIR)}")
+    if not prefetch(args.models):
+        return 1
+
+    # Load in a fresh process: strictly offline, and timings not skewed
+    # by the libraries this one already imported
+    command = [sys.executable, "-m", "ModelRegistry.bootstrap", "--check"]
+    if args.models:
+        command += ["--models", *args.models]
+    env = dict(os.environ, MODELS_OFFLINE="1", MODEL_CACHE_DIR=os.path.abspath(MODEL_CACHE_DIR))
+    return subprocess.call(command, env=env)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
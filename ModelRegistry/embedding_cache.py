@@ -0,0 +1,310 @@
+"""
+embedding_cache.py
+------------------
+Caches MiniLM phrase embeddings, so the domain phrases that recur in
+almost every upload ("neural network", "machine learning") are encoded
+once and only unseen phrases reach the model.
+
+Two tiers, keyed by (model name, normalized phrase):
+- memory: an LRU of EMBEDDING_MEMORY_ITEMS vectors per process
+- disk:   a memory-mapped vector file of EMBEDDING_DISK_ITEMS rows shared
+          by every process, with an SQLite index (phrase -> row, last use);
+          when full, the least recently used rows are overwritten
+
+Writers lock the index exclusively while they write rows, and readers
+read rows inside a read transaction, so a row is never read while it is
+being reused. Set EMBEDDING_CACHE_PATH to an empty string to keep only
+the memory tier.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from ModelRegistry.registry import get_model, SENTENCE_MODEL
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+EMBEDDING_CACHE_PATH = os.getenv(
+    "EMBEDDING_CACHE_PATH", os.path.join(BASE_DIR, "../Cache/embeddings")
+)
+EMBEDDING_MEMORY_ITEMS = int(os.getenv("EMBEDDING_MEMORY_ITEMS", "20000"))
+EMBEDDING_DISK_ITEMS = int(os.getenv("EMBEDDING_DISK_ITEMS", "100000"))
+# float16 halves the disk tier at ~1e-3 relative error per component
+EMBEDDING_CACHE_DTYPE = os.getenv("EMBEDDING_CACHE_DTYPE", "float32")
+
+# Name of the model behind SENTENCE_MODEL, part of every cache key
+SENTENCE_MODEL_NAME = "all-MiniLM-L6-v2"
+
+
+def normalize_phrase(phrase: str) -> str:
+    return " ".join(phrase.lower().split())
+
+
+class _DiskTier:
+    """Fixed-capacity vector file plus an SQLite index; one connection per thread."""
+
+    def __init__(self, directory: str, name: str, dim: int, dtype: str, capacity: int):
+        os.makedirs(directory, exist_ok=True)
+        self.index_path = os.path.join(directory, f"{name}.sqlite3")
+        self.vectors_path = os.path.join(directory, f"{name}.vectors")
+        self._local = threading.local()
+
+        conn = self._connection()
+        conn.execute("BEGIN EXCLUSIVE")
+        try:
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS vectors ("
+                " phrase TEXT PRIMARY KEY, row INTEGER NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS vectors_last_used ON vectors (last_used)")
+
+            layout = f"{dim}:{dtype}:{capacity}"
+            stored = conn.execute("SELECT value FROM meta WHERE key = 'layout'").fetchone()
+            size = capacity * dim * np.dtype(dtype).itemsize
+            if stored is None or stored[0] != layout or not os.path.exists(self.vectors_path) \
+                    or os.path.getsize(self.vectors_path) != size:
+                # New cache or changed settings: start over
+                conn.execute("DELETE FROM vectors")
+                conn.execute("INSERT OR REPLACE INTO meta VALUES ('layout', ?)", (layout,))
+                with open(self.vectors_path, "wb") as f:
+                    f.truncate(size)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+        self.capacity = capacity
+        self.vectors = np.memmap(self.vectors_path, dtype=dtype, mode="r+", shape=(capacity, dim))
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Transactions are explicit; the default rollback journal lets a
+            # writer's exclusive lock wait for readers of rows it may reuse
+            conn = sqlite3.connect(self.index_path, timeout=30, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    def get(self, phrases) -> dict:
+        """Stored vectors of `phrases` as {phrase: float32 vector}."""
+        conn = self._connection()
+        found = {}
+        conn.execute("BEGIN")
+        try:
+            for i in range(0, len(phrases), 500):
+                chunk = phrases[i:i + 500]
+                rows = conn.execute(
+                    f"SELECT phrase, row FROM vectors WHERE phrase IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall()
+                for phrase, row in rows:
+                    found[phrase] = np.array(self.vectors[row], dtype=np.float32)
+        finally:
+            conn.execute("COMMIT")
+
+        if found:
+            now = time.time()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.executemany(
+                    "UPDATE vectors SET last_used = ? WHERE phrase = ?",
+                    [(now, phrase) for phrase in found],
+                )
+                conn.execute("COMMIT")
+            except sqlite3.OperationalError:
+                # Recency is best effort; a busy index must not fail the lookup
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+        return found
+
+    def put(self, items: dict):
+        """Stores {phrase: vector}, overwriting least recently used rows when full."""
+        items = dict(list(items.items())[-self.capacity:])
+        conn = self._connection()
+        conn.execute("BEGIN EXCLUSIVE")
+        try:
+            phrases = list(items)
+            known = set()
+            for i in range(0, len(phrases), 500):
+                chunk = phrases[i:i + 500]
+                known.update(p for (p,) in conn.execute(
+                    f"SELECT phrase FROM vectors WHERE phrase IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                ))
+            new = [p for p in phrases if p not in known]
+
+            # Rows are dense: 0..count-1 are in use, eviction reuses rows
+            count = conn.execute("SELECT COUNT(*) FROM vectors").fetchone()[0]
+            free = list(range(count, min(self.capacity, count + len(new))))
+            if len(free) < len(new):
+                victims = conn.execute(
+                    "SELECT phrase, row FROM vectors ORDER BY last_used LIMIT ?",
+                    (len(new) - len(free),),
+                ).fetchall()
+                conn.executemany("DELETE FROM vectors WHERE phrase = ?", [(p,) for p, _ in victims])
+                free += [row for _, row in victims]
+
+            now = time.time()
+            for phrase, row in zip(new, free):
+                self.vectors[row] = items[phrase]
+            self.vectors.flush()
+            conn.executemany(
+                "INSERT INTO vectors (phrase, row, last_used) VALUES (?, ?, ?)",
+                [(phrase, row, now) for phrase, row in zip(new, free)],
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+
+class EmbeddingCache:
+    """Memory LRU in front of an optional shared disk tier, for one model."""
+
+    def __init__(self, model_name: str, directory: str = None,
+                 memory_items: int = EMBEDDING_MEMORY_ITEMS,
+                 disk_items: int = EMBEDDING_DISK_ITEMS,
+                 dtype: str = EMBEDDING_CACHE_DTYPE):
+        self.model_name = model_name
+        self.directory = directory
+        self.memory_items = memory_items
+        self.disk_items = disk_items
+        self.dtype = dtype
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk = None
+        self._disk_failed = False
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+    def encode(self, phrases, encoder) -> np.ndarray:
+        """
+        Embeddings of `phrases` (one row each, float32), calling
+        `encoder(list_of_phrases)` only for phrases found in neither tier.
+        """
+        phrases = list(phrases)
+        keys = [normalize_phrase(p) for p in phrases]
+        vectors = {}
+
+        with self._lock:
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    vectors[key] = vector
+        memory_found = len(vectors)
+
+        wanted = [key for key in dict.fromkeys(keys) if key not in vectors]
+        disk = self._disk_tier()
+        if wanted and disk is not None:
+            try:
+                vectors.update(disk.get(wanted))
+            except sqlite3.Error as e:
+                logger.warning(f"Embedding cache read failed: {e}")
+        disk_hits = len(vectors) - memory_found
+
+        # Encode each missing phrase once, as given (first spelling wins)
+        missing = {}
+        for phrase, key in zip(phrases, keys):
+            if key not in vectors and key not in missing:
+                missing[key] = phrase
+        if missing:
+            encoded = np.asarray(encoder(list(missing.values())), dtype=np.float32)
+            fresh = dict(zip(missing, encoded))
+            vectors.update(fresh)
+            disk = self._disk_tier(dim=encoded.shape[1])
+            if disk is not None:
+                try:
+                    disk.put(fresh)
+                except sqlite3.Error as e:
+                    logger.warning(f"Embedding cache write failed: {e}")
+
+        with self._lock:
+            for key in wanted:
+                if key in vectors:
+                    self._memory[key] = vectors[key]
+                    self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+            # Repeats within the call count as memory hits
+            self.stats["memory_hits"] += len(keys) - disk_hits - len(missing)
+            self.stats["disk_hits"] += disk_hits
+            self.stats["misses"] += len(missing)
+
+        if not keys:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.stack([vectors[key] for key in keys])
+
+    def hit_rate(self) -> float:
+        with self._lock:
+            hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+            total = hits + self.stats["misses"]
+        return hits / total if total else 0.0
+
+    def _disk_tier(self, dim: int = None):
+        """The disk tier; opened once its dimension is known (stored or from `dim`)."""
+        if self._disk is not None or self._disk_failed or not self.directory or self.disk_items <= 0:
+            return self._disk
+        if dim is None:
+            dim = _stored_dim(self.directory, self.model_name)
+            if dim is None:
+                return None
+        with self._lock:
+            if self._disk is None and not self._disk_failed:
+                try:
+                    self._disk = _DiskTier(
+                        self.directory, self.model_name, dim, self.dtype, self.disk_items
+                    )
+                except (sqlite3.Error, OSError, ValueError) as e:
+                    logger.warning(f"Embedding disk cache disabled ({self.directory}): {e}")
+                    self._disk_failed = True
+        return self._disk
+
+
+def _stored_dim(directory, name):
+    """Vector size recorded by an earlier run, or None."""
+    path = os.path.join(directory, f"{name}.sqlite3")
+    if not os.path.exists(path):
+        return None
+    try:
+        with sqlite3.connect(path, timeout=30) as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'layout'").fetchone()
+    except sqlite3.Error:
+        return None
+    return int(row[0].split(":")[0]) if row else None
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = EmbeddingCache(SENTENCE_MODEL_NAME, EMBEDDING_CACHE_PATH or None)
+    return _cache
+
+
+def encode_phrases(phrases) -> np.ndarray:
+    """MiniLM embeddings of `phrases` through the cache; the model loads only on a miss."""
+    return get_embedding_cache().encode(
+        phrases, lambda missing: get_model(SENTENCE_MODEL).encode(missing)
+    )
+
+
+def embedding_cache_stats() -> dict:
+    cache = get_embedding_cache()
+    with cache._lock:
+        stats = dict(cache.stats, memory_items=len(cache._memory))
+    stats["hit_rate"] = round(cache.hit_rate(), 4)
+    return stats
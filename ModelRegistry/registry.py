@@ -0,0 +1,267 @@
+"""
+registry.py
+-----------
+One process-wide owner for every model the pipeline loads: spaCy, the
+MiniLM sentence encoder, the EasyOCR reader and the spell checker.
+
+Models are loaded on first use, once per process, however many modules
+use them. Callers fetch them with get_model() at the point of use
+instead of keeping a module-level reference, so an idle model can be
+evicted (see evict_idle_models, scheduled by the Flask app) and is
+simply reloaded by the next request that needs it.
+
+model_stats() reports per model the load time and the resident memory
+the process grew by while loading it (approximate: it includes the
+first import of the model's libraries).
+
+Models are read from MODEL_CACHE_DIR when a local copy is there (see
+bootstrap.py, which fetches them). With MODELS_OFFLINE=1 nothing is
+ever downloaded: Hugging Face runs in offline mode and a missing local
+copy is an error instead of a download.
+"""
+
+import gc
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Models unused for this many seconds are evicted (0 = never)
+MODEL_IDLE_SECONDS = int(os.getenv("MODEL_IDLE_SECONDS", "0"))
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Local copies of the models, filled by `python -m ModelRegistry.bootstrap`
+MODEL_CACHE_DIR = os.getenv("MODEL_CACHE_DIR", os.path.join(BASE_DIR, "../Cache/models"))
+# Never touch the network when loading (air-gapped workers)
+MODELS_OFFLINE = os.getenv("MODELS_OFFLINE", "0") == "1"
+
+if MODELS_OFFLINE:
+    # Read by huggingface_hub / transformers at import, so set before any load
+    os.environ.setdefault("HF_HUB_OFFLINE", "1")
+    os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+
+SPACY_MODEL = "spacy"
+SENTENCE_MODEL = "minilm"
+OCR_MODEL = "easyocr"
+SPELL_CHECKER = "spellchecker"
+STOPWORD_SET = "stopwords"
+
+# Directory of each model's local copy, under MODEL_CACHE_DIR
+_LOCAL_DIRS = {
+    SPACY_MODEL: "en_core_web_sm",
+    SENTENCE_MODEL: "all-MiniLM-L6-v2",
+    OCR_MODEL: "easyocr",
+    STOPWORD_SET: "nltk_data",
+}
+
+
+class _Entry:
+    def __init__(self, name, loader, evictable):
+        self.name = name
+        self.loader = loader
+        self.evictable = evictable
+        self.model = None
+        self.lock = threading.Lock()
+        self.loads = 0
+        self.load_seconds = None
+        self.rss_bytes = None
+        self.last_used = None
+
+
+class ModelRegistry:
+    """Named, lazily loaded models with usage tracking and idle eviction."""
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, loader, evictable: bool = True):
+        """Registers `loader()` as the way to load model `name`."""
+        with self._lock:
+            self._entries[name] = _Entry(name, loader, evictable)
+
+    def get(self, name: str):
+        """The model registered as `name`, loaded on first use."""
+        entry = self._entries.get(name)
+        if entry is None:
+            raise KeyError(f"No model registered as {name!r}")
+
+        entry.last_used = time.monotonic()
+        model = entry.model
+        if model is not None:
+            return model
+
+        with entry.lock:
+            if entry.model is None:
+                rss_before = resident_bytes()
+                start = time.perf_counter()
+                entry.model = entry.loader()
+                entry.load_seconds = time.perf_counter() - start
+                rss_after = resident_bytes()
+                if rss_before is not None and rss_after is not None:
+                    entry.rss_bytes = max(0, rss_after - rss_before)
+                entry.loads += 1
+                logger.info(
+                    f"Loaded model {name} in {entry.load_seconds:.1f}s"
+                    + (f" (+{entry.rss_bytes / 2**20:.0f} MB resident)" if entry.rss_bytes is not None else "")
+                )
+            entry.last_used = time.monotonic()
+            return entry.model
+
+    def evict(self, name: str) -> bool:
+        """Drops the registry's reference to a loaded model; True if one was dropped."""
+        entry = self._entries.get(name)
+        if entry is None or entry.model is None:
+            return False
+        with entry.lock:
+            entry.model = None
+        gc.collect()
+        logger.info(f"Evicted model {name}")
+        return True
+
+    def evict_idle(self, max_idle_seconds: float) -> list:
+        """Evicts evictable models unused for `max_idle_seconds`; returns their names."""
+        now = time.monotonic()
+        idle = [
+            entry.name for entry in list(self._entries.values())
+            if entry.evictable and entry.model is not None
+            and now - entry.last_used >= max_idle_seconds
+        ]
+        return [name for name in idle if self.evict(name)]
+
+    def stats(self) -> dict:
+        """Per model: loaded, load count, last load time, resident MB added, idle seconds."""
+        now = time.monotonic()
+        return {
+            entry.name: {
+                "loaded": entry.model is not None,
+                "loads": entry.loads,
+                "load_seconds": entry.load_seconds,
+                "resident_mb": None if entry.rss_bytes is None else round(entry.rss_bytes / 2**20, 1),
+                "idle_seconds": None if entry.last_used is None else round(now - entry.last_used),
+            }
+            for entry in list(self._entries.values())
+        }
+
+
+def resident_bytes():
+    """Resident memory of this process in bytes, or None where it cannot be read."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+
+    if os.name == "nt":
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [
+                ("cb", wintypes.DWORD),
+                ("PageFaultCount", wintypes.DWORD),
+                ("PeakWorkingSetSize", ctypes.c_size_t),
+                ("WorkingSetSize", ctypes.c_size_t),
+                ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                ("PagefileUsage", ctypes.c_size_t),
+                ("PeakPagefileUsage", ctypes.c_size_t),
+            ]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        if ctypes.windll.psapi.GetProcessMemoryInfo(
+            ctypes.windll.kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb
+        ):
+            return counters.WorkingSetSize
+
+    return None
+
+
+# ---------------------------------------
+# Process-wide registry and the shared models
+# ---------------------------------------
+
+registry = ModelRegistry()
+
+
+def model_path(name: str) -> str:
+    """Where the local copy of model `name` lives (it may not exist yet)."""
+    return os.path.join(MODEL_CACHE_DIR, _LOCAL_DIRS[name])
+
+
+def _load_spacy():
+    import spacy
+    path = model_path(SPACY_MODEL)
+    # The installed en_core_web_sm package is local too
+    return spacy.load(path if os.path.isdir(path) else "en_core_web_sm")
+
+
+def _load_sentence_model():
+    from sentence_transformers import SentenceTransformer
+    path = model_path(SENTENCE_MODEL)
+    if os.path.isdir(path):
+        return SentenceTransformer(path)
+    if MODELS_OFFLINE:
+        logger.warning(f"No local MiniLM at {path}; trying the Hugging Face cache offline")
+    return SentenceTransformer("all-MiniLM-L6-v2")
+
+
+def _load_stopwords():
+    import nltk
+    from nltk.corpus import stopwords
+
+    path = model_path(STOPWORD_SET)
+    if path not in nltk.data.path:
+        nltk.data.path.insert(0, path)
+    try:
+        return frozenset(stopwords.words("english"))
+    except LookupError:
+        if MODELS_OFFLINE:
+            raise
+    # Online and not fetched yet: fetch into the model cache, once
+    nltk.download("stopwords", download_dir=path, quiet=True)
+    return frozenset(stopwords.words("english"))
+
+
+def _load_spell_checker():
+    from spellchecker import SpellChecker
+    return SpellChecker()
+
+
+def _load_ocr_reader():
+    # Reader settings live with the OCR code
+    from TextCleaning.diagramText import load_ocr_reader
+    return load_ocr_reader()
+
+
+registry.register(SPACY_MODEL, _load_spacy)
+registry.register(SENTENCE_MODEL, _load_sentence_model)
+registry.register(OCR_MODEL, _load_ocr_reader)
+registry.register(SPELL_CHECKER, _load_spell_checker)
+registry.register(STOPWORD_SET, _load_stopwords, evictable=False)
+
+
+def get_model(name: str):
+    """Shared model `name` (SPACY_MODEL, SENTENCE_MODEL, OCR_MODEL, SPELL_CHECKER, STOPWORD_SET)."""
+    return registry.get(name)
+
+
+def model_stats() -> dict:
+    return registry.stats()
+
+
+def evict_idle_models(max_idle_seconds: float = None) -> list:
+    """Evicts models idle for `max_idle_seconds` (MODEL_IDLE_SECONDS by default)."""
+    if max_idle_seconds is None:
+        max_idle_seconds = MODEL_IDLE_SECONDS
+    if max_idle_seconds <= 0:
+        return []
+    evicted = registry.evict_idle(max_idle_seconds)
+    if evicted:
+        print(f"[INFO] Evicted idle models: {', '.join(evicted)}")
+    return evicted
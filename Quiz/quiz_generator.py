@@ -324,10 +324,21 @@ def distribute_questions_across_clusters(all_clusters_info, max_questions, min_p
 # ============================================================
 # 🔥 NEW: Full PDF → Quiz Pipeline (Cluster-Based)
 # ============================================================
-def generate_quiz_from_pdf(pdf_path, max_questions=20, save=True):
+def generate_quiz_from_pdf(pdf_path, max_questions=20, save=True, documents=None,
+                           clusters=None, quiz_key=None):
+    """
+    `documents` optionally maps each path to the ParsedDocument the upload
+    route already opened, so extraction reuses that parse instead of
+    reopening the file.
+    `clusters` optionally maps a path to keyword clusters recorded for the
+    same content earlier; those PDFs skip extraction and clustering.
+    `quiz_key` replaces the name-based cache key (see build_content_key).
+    """
     # ----------------------------------
     # Normalize input
     # ----------------------------------
+    documents = documents or {}
+    known_clusters = clusters or {}
     print("🔥 generate_quiz_from_pdf CALLED WITH:", pdf_path)
     pdf_paths = pdf_path if isinstance(pdf_path, list) else [pdf_path]
     num_pdfs = len(pdf_paths)
@@ -337,7 +348,7 @@ def generate_quiz_from_pdf(pdf_path, max_questions=20, save=True):
         print(f"  {i}. {os.path.basename(p)}")
 
     # Check cache
-    existing = load_existing_quiz(pdf_paths)
+    existing = load_existing_quiz(pdf_paths, quiz_key=quiz_key)
     if existing is not None:
         print("✅ Using cached quiz")
         return existing
@@ -353,7 +364,11 @@ def generate_quiz_from_pdf(pdf_path, max_questions=20, save=True):
         pdf_name = os.path.basename(path).replace('.pdf', '')
         print(f"\n  Processing PDF {idx}/{num_pdfs}: {pdf_name}")
         
-        clusters = get_clusters(path)
+        if path in known_clusters:
+            print("    ✓ Reusing clusters recorded for this content")
+            clusters = known_clusters[path]
+        else:
+            clusters = get_clusters(documents.get(path, path))
         per_pdf_clusters[path] = clusters
         
         # Store each cluster with metadata
@@ -442,7 +457,7 @@ def generate_quiz_from_pdf(pdf_path, max_questions=20, save=True):
     # ----------------------------------
     if save:
         print("\n💾 Step 5: Saving quiz...")
-        save_quiz(pdf_paths, all_questions)
+        save_quiz(pdf_paths, all_questions, quiz_key=quiz_key)
 
     return {
         "pdf_path": pdf_paths,
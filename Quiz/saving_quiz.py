@@ -115,14 +115,39 @@ def build_pdf_base_name(pdf_list):
     # ORDER-INDEPENDENT
     return "_".join(sorted(base_names))
 
+# ============================================================
+# Helper to build a content-addressed quiz key
+# ============================================================
+def build_content_key(digests):
+    """
+    Returns an order-independent cache key for a set of PDFs identified by
+    the SHA-256 of their content:
+    - single PDF  → its digest
+    - multiple PDFs → SHA-256 of the sorted digests
+    Unlike build_pdf_base_name, two different files named paper.pdf never
+    share a key, and a renamed copy of a known file keeps its key.
+    """
+    if isinstance(digests, str):
+        digests = [digests]
+
+    digests = sorted(digests)
+    if len(digests) == 1:
+        return digests[0]
+
+    return hashlib.sha256("_".join(digests).encode("utf-8")).hexdigest()
+
 # ============================================================
 # Save or retrieve quiz from cache
 # ============================================================
-def save_quiz(pdf_paths, quiz_data):
+def save_quiz(pdf_paths, quiz_data, quiz_key=None):
+    """
+    Saves under `quiz_key` (see build_content_key) when given, otherwise
+    under the PDF base name. An existing file is kept.
+    """
     os.makedirs(QUIZZES_FOLDER, exist_ok=True)
 
     quiz_base = build_pdf_base_name(pdf_paths)
-    quiz_file_path = os.path.join(QUIZZES_FOLDER, f"{quiz_base}.json")
+    quiz_file_path = os.path.join(QUIZZES_FOLDER, f"{quiz_key or quiz_base}.json")
 
     # Cache check
     if os.path.exists(quiz_file_path):
@@ -204,9 +229,9 @@ def save_user_attempt(user_id, pdf_paths, attempt_record):
         "saq_average": avg_saq_score
     }
 
-def load_existing_quiz(pdf_paths):
+def load_existing_quiz(pdf_paths, quiz_key=None):
     quiz_base = build_pdf_base_name(pdf_paths)
-    quiz_file_path = os.path.join(QUIZZES_FOLDER, f"{quiz_base}.json")
+    quiz_file_path = os.path.join(QUIZZES_FOLDER, f"{quiz_key or quiz_base}.json")
 
     print(f"🔎 Looking for quiz file: {quiz_file_path}")
 
@@ -1,16 +1,122 @@
-import fitz  # PyMuPDF
 from typing import List
-import easyocr
 import numpy as np
-from sklearn.cluster import DBSCAN
-from collections import defaultdict
+from collections import Counter, defaultdict, namedtuple
 import cv2
+import hashlib
+import os
 import re
+import threading
+
+from TextCleaning.document import open_document
+from TextCleaning.extraction_cache import cached_pages, lookup_images, store_images
+from TextCleaning.scannedText import (
+    SCAN_OCR, SCAN_MIN_PAGE_CHARS, SCAN_MIN_IMAGE_COVERAGE, SCAN_PAGE_BUDGET, ocr_page_indices
+)
+from TextCleaning.ocrService import OCR_SERVICE_ADDRESS, RemoteOCRReader
+from TextCleaning.ocrSettings import OCR_GPU, OCR_QUANTIZE, OCR_ENGINE_VERSION
+from ModelRegistry.registry import get_model, model_path, MODELS_OFFLINE, OCR_MODEL
+
+# ---------------------------------------
+# OCR reader settings (OCR_GPU / OCR_QUANTIZE live in ocrSettings.py)
+# ---------------------------------------
+# torch intra-op threads for OCR (0 = torch default)
+OCR_THREADS = int(os.getenv("OCR_THREADS", "0"))
+# Diagrams OCR'd per readtext_batched call (1 = one readtext call per image)
+OCR_BATCH_SIZE = int(os.getenv("OCR_BATCH_SIZE", "8"))
+# Batched images are padded up to a multiple of this in both dimensions,
+# so similar sizes share a batch shape at little padding cost
+OCR_BUCKET_STEP = int(os.getenv("OCR_BUCKET_STEP", "256"))
+# Images are decoded to at most this many pixels on their long side
+# (0 = full resolution); boxes are mapped back to the original scale
+OCR_MAX_SIDE = int(os.getenv("OCR_MAX_SIDE", "2048"))
 
 # ---------------------------------------
-# GLOBAL: Load EasyOCR reader only once.
+# Diagram pre-filter: cheap OpenCV features that drop images unlikely to
+# carry diagram text (photographs, page backgrounds) before easyocr sees
+# them. A threshold of 0 disables that test. Off by default until the
+# thresholds are tuned on a real upload corpus with
+# benchmarks/bench_diagram_filter.py (OCR calls avoided vs keywords lost).
 # ---------------------------------------
-OCR_READER = easyocr.Reader(['en'], gpu=True)
+DIAGRAM_FILTER = os.getenv("DIAGRAM_FILTER", "0") == "1"
+# Canny edge pixels / all pixels; blank images and backgrounds sit near 0
+DIAGRAM_MIN_EDGE_DENSITY = float(os.getenv("DIAGRAM_MIN_EDGE_DENSITY", "0.002"))
+# Share of pixels in the 8 most common colours (3 bits per channel):
+# drawn figures are mostly flat fills, photographs spread over hundreds
+DIAGRAM_MIN_FLAT_COLOUR = float(os.getenv("DIAGRAM_MIN_FLAT_COLOUR", "0.5"))
+# Character-sized MSER regions
+DIAGRAM_MIN_TEXT_REGIONS = int(os.getenv("DIAGRAM_MIN_TEXT_REGIONS", "4"))
+# Features are computed on a copy at most this many pixels on its long side
+DIAGRAM_FEATURE_SIDE = 512
+
+# Version of the diagram texts persisted in extraction_cache.py; bump the
+# leading number when OCR grouping or clean_ocr_text changes. Per-page
+# texts also depend on the pre-filter settings.
+OCR_EXTRACTOR_VERSION = (
+    f"1-{OCR_ENGINE_VERSION}"
+    + ("-b" if OCR_BATCH_SIZE > 1 else "")
+    + (f"-s{OCR_MAX_SIDE}" if OCR_MAX_SIDE > 0 else "")
+)
+DIAGRAM_FILTER_VERSION = (
+    f"-f{DIAGRAM_MIN_EDGE_DENSITY},{DIAGRAM_MIN_FLAT_COLOUR},{DIAGRAM_MIN_TEXT_REGIONS}"
+    if DIAGRAM_FILTER else ""
+) + (f"-scan{SCAN_MIN_PAGE_CHARS},{SCAN_MIN_IMAGE_COVERAGE},{SCAN_PAGE_BUDGET}" if SCAN_OCR else "")
+
+# A decoded candidate image, its content hash and where it was first seen
+Diagram = namedtuple("Diagram", "key page_index img_index image width height")
+
+# Pre-filter features of one image (see diagram_features)
+DiagramFeatures = namedtuple("DiagramFeatures", "edge_density flat_colour text_regions")
+
+# Image occurrences / repeats within a document / persistent cache hits /
+# images sent to OCR / images dropped by the pre-filter
+OCR_IMAGE_STATS = Counter()
+_stats_lock = threading.Lock()
+
+# ---------------------------------------
+# EasyOCR reader: owned by the model registry, loaded once on first use.
+# Importing this module does not import torch, so workers that never OCR
+# never pay for it. With OCR_SERVICE_ADDRESS set the model lives in the
+# OCR service instead (see ocrService.py) and is never loaded here.
+# ---------------------------------------
+
+def get_ocr_reader():
+    """The reader OCR calls go through: the OCR service's, or the in-process one."""
+    if OCR_SERVICE_ADDRESS:
+        return RemoteOCRReader()
+    return get_local_ocr_reader()
+
+
+def get_local_ocr_reader():
+    return get_model(OCR_MODEL)
+
+
+def load_ocr_reader():
+    """Builds the EasyOCR reader from the OCR_* settings (called by the registry)."""
+    import easyocr
+    import torch
+
+    if OCR_THREADS > 0:
+        torch.set_num_threads(OCR_THREADS)
+
+    # Weights from the model cache when fetched there (bootstrap.py),
+    # otherwise from EasyOCR's own ~/.EasyOCR; offline, never downloaded
+    storage = model_path(OCR_MODEL)
+    print(f"[INFO] Loading EasyOCR reader (gpu={OCR_GPU}, quantize={OCR_QUANTIZE})")
+    return easyocr.Reader(
+        ['en'], gpu=OCR_GPU, quantize=OCR_QUANTIZE, verbose=False,
+        model_storage_directory=storage if os.path.isdir(storage) else None,
+        download_enabled=not MODELS_OFFLINE
+    )
+
+
+def warm_up_ocr():
+    """
+    Loads the reader and runs one blank image through it, so the first
+    upload does not pay for model loading and first-call initialisation.
+    Meant for server start-up.
+    """
+    reader = get_ocr_reader()
+    reader.readtext(np.full((64, 256, 3), 255, dtype=np.uint8), detail=1)
 
 def clean_ocr_text(text: str) -> str:
     """
@@ -71,88 +177,387 @@ def get_eps_for_image(width, height):
         return 120
 
 
-def extract_from_pdf(pdf_path: str, min_width=150, min_height=150) -> List[str]:
+def extract_from_pdf(pdf_path, min_width=150, min_height=150) -> List[str]:
     """
     Faster optimized version:
-    - Avoids re-creating EasyOCR reader
+    - Avoids re-creating EasyOCR reader (created on first use)
+    - Reuses the image xrefs of a shared ParsedDocument
     - Skips unnecessary decoding
     - Reduces OpenCV overhead
     - Keeps all functionality identical
     """
-    doc = fitz.open(pdf_path)
-    extracted_texts = []
+    with open_document(pdf_path) as document:
+        return _extract_from_document(document, min_width, min_height)
 
-    print(f"\n[INFO] Processing PDF: {pdf_path}")
 
-    for page_index, page in enumerate(doc):
-        image_list = page.get_images(full=True)
+def _extract_from_document(document, min_width, min_height) -> str:
+    print(f"\n[INFO] Processing PDF: {document.path or document.name}")
+
+    # Diagram texts are persisted per page, keyed by the size filter too
+    page_texts = cached_pages(
+        document, f"easyocr.diagrams:{min_width}x{min_height}",
+        OCR_EXTRACTOR_VERSION + DIAGRAM_FILTER_VERSION,
+        lambda pages: _extract_pages_diagrams(document, pages, min_width, min_height)
+    )
+
+    return "\n".join(text for texts in page_texts for text in texts)
 
-        if not image_list:
-            continue
 
-        for img_index, img in enumerate(image_list):
+def _extract_pages_diagrams(document, page_indices, min_width, min_height) -> List[List[str]]:
+    """
+    Diagram texts of each page in `page_indices`, in page and image order.
+
+    Each distinct image is OCR'd at most once: a repeated xref or identical
+    image bytes reuse the first occurrence's texts, and texts are persisted
+    by image content hash, so an image seen in any earlier document (a
+    journal logo, a banner) never reaches easyocr again. Scanned pages
+    within the scan budget are left to the full-page OCR of the text path. Of the rest, the
+    pre-filter drops images unlikely to hold diagram text (cached texts
+    are used as they are), and with OCR_BATCH_SIZE > 1 the survivors are
+    OCR'd in size-bucketed batches.
+    """
+    occurrences = []    # (page_index, image key), in page and image order
+    candidates = {}     # image key -> (page_index, img_index, bytes, width, height)
+    keys_by_xref = {}
+
+    # Scanned pages OCR'd whole into the main text are skipped; pages past
+    # the scan budget keep their diagram OCR (see scannedText.py)
+    skipped = set(ocr_page_indices(document))
+
+    for page_index in page_indices:
+        if page_index in skipped:
+            continue
+        for img_index, img in enumerate(document.page_images(page_index)):
             xref = img[0]
-            base_image = doc.extract_image(xref)
+            if xref not in keys_by_xref:
+                keys_by_xref[xref] = _image_key(
+                    document, xref, page_index, img_index, min_width, min_height, candidates
+                )
+            key = keys_by_xref[xref]
+            if key is not None:
+                occurrences.append((page_index, key))
+
+    texts_by_key = lookup_images("easyocr.image", OCR_EXTRACTOR_VERSION, candidates)
+    misses = {key: c for key, c in candidates.items() if key not in texts_by_key}
+
+    diagrams = _decode_diagrams(misses)
+    if OCR_BATCH_SIZE > 1:
+        ocr_pairs = readtext_bucketed(diagrams, OCR_BATCH_SIZE)
+    else:
+        ocr_pairs = ((d, get_ocr_reader().readtext(d.image, detail=1)) for d in diagrams)
 
-            width = base_image.get("width", 0)
-            height = base_image.get("height", 0)
+    fresh = {}
+    for diagram, ocr_results in ocr_pairs:
+        if not ocr_results:
+            # Remembered too, so text-free images are not OCR'd again
+            fresh[diagram.key] = []
+            continue
+        ocr_results = _to_original_scale(ocr_results, diagram)
+        fresh[diagram.key] = cluster_ocr_text(ocr_results, diagram.width, diagram.height)
+        print(f"[✓] Extracted clustered text from diagram p{diagram.page_index + 1}-{diagram.img_index + 1}")
+
+    store_images("easyocr.image", OCR_EXTRACTOR_VERSION, fresh)
+    texts_by_key.update(fresh)
+
+    with _stats_lock:
+        OCR_IMAGE_STATS["images"] += len(occurrences)
+        OCR_IMAGE_STATS["repeats"] += len(occurrences) - len(candidates)
+        OCR_IMAGE_STATS["hits"] += len(candidates) - len(misses)
+        OCR_IMAGE_STATS["misses"] += len(misses)
+    totals = ocr_image_stats()
+    print(
+        f"[INFO] Diagram OCR: {len(occurrences)} images, {len(candidates)} distinct, "
+        f"{len(candidates) - len(misses)} cached, {len(misses)} new "
+        f"(since start-up: {totals['hits']} cached, {totals['misses']} new, "
+        f"{totals.get('filtered', 0)} filtered)"
+    )
+
+    # Images that failed to decode have no texts
+    page_texts = {page_index: [] for page_index in page_indices}
+    for page_index, key in occurrences:
+        page_texts[page_index].extend(texts_by_key.get(key, []))
+    return [page_texts[page_index] for page_index in page_indices]
+
+
+def _image_key(document, xref, page_index, img_index, min_width, min_height, candidates):
+    """
+    Content hash of an image above the size limits (None when it is skipped),
+    recording its first occurrence in `candidates`.
+    """
+    base_image = document.doc.extract_image(xref)
+
+    width = base_image.get("width", 0)
+    height = base_image.get("height", 0)
+
+    # Skip small images
+    if width < min_width or height < min_height:
+        return None
+
+    img_bytes = base_image["image"]
+
+    # very fast skip if image is invalid
+    if not img_bytes:
+        return None
+
+    key = hashlib.sha256(img_bytes).hexdigest()
+    if key not in candidates:
+        candidates[key] = (page_index, img_index, img_bytes, width, height)
+    return key
+
+
+def _decode_diagrams(candidates):
+    """
+    Yields a Diagram for every decodable image of {key: first occurrence}
+    that passes the pre-filter (when DIAGRAM_FILTER is on).
+    """
+    for key, (page_index, img_index, img_bytes, width, height) in candidates.items():
+        img_cv = decode_image(img_bytes, width, height, OCR_MAX_SIDE)
+        if img_cv is None:
+            continue
 
-            # Skip small images
-            if width < min_width or height < min_height:
-                continue
+        if DIAGRAM_FILTER and not looks_like_diagram(img_cv):
+            with _stats_lock:
+                OCR_IMAGE_STATS["filtered"] += 1
+            continue
 
-            img_bytes = base_image["image"]
+        yield Diagram(key, page_index, img_index, img_cv, width, height)
 
-            # very fast skip if image is invalid
-            if not img_bytes:
-                continue
 
-            # Convert bytes → numpy → OpenCV
-            img_np = np.frombuffer(img_bytes, np.uint8)
-            img_cv = cv2.imdecode(img_np, cv2.IMREAD_COLOR)
+def decode_image(img_bytes, width: int = 0, height: int = 0, max_side: int = 0):
+    """
+    Encoded image bytes -> BGR array, or None when OpenCV cannot decode them.
 
-            if img_cv is None:
-                continue
+    With `max_side` > 0 and the image's `width` x `height` known, the image
+    is decoded straight to a 1/2, 1/4 or 1/8 reduction (JPEG is then scaled
+    inside the decoder, never held at full size) and only what is still
+    above `max_side` is resized. A reduction may land up to a quarter below
+    `max_side`, which is still legible and saves a full-size decode.
+    """
+    # Convert bytes → numpy → OpenCV
+    img_np = np.frombuffer(img_bytes, np.uint8)
+
+    flag = cv2.IMREAD_COLOR
+    if max_side > 0:
+        long_side = max(width, height)
+        for factor, reduced in _REDUCED_DECODE:
+            if long_side * 4 >= max_side * factor * 3:
+                flag = reduced
+                break
+
+    img_cv = cv2.imdecode(img_np, flag)
+    if img_cv is None or max_side <= 0:
+        return img_cv
+
+    h, w = img_cv.shape[:2]
+    scale = max_side / max(h, w)
+    if scale < 1:
+        img_cv = cv2.resize(
+            img_cv, (max(1, round(w * scale)), max(1, round(h * scale))),
+            interpolation=cv2.INTER_AREA
+        )
+    return img_cv
+
+
+_REDUCED_DECODE = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+
+def _to_original_scale(ocr_results, diagram):
+    """OCR results of a downscaled Diagram with boxes in original image pixels."""
+    h, w = diagram.image.shape[:2]
+    if (w, h) == (diagram.width, diagram.height):
+        return ocr_results
+
+    sx = diagram.width / w
+    sy = diagram.height / h
+    return [
+        ([[x * sx, y * sy] for x, y in bbox], text, conf)
+        for bbox, text, conf in ocr_results
+    ]
 
-            # OCR with bounding boxes
-            ocr_results = OCR_READER.readtext(img_cv, detail=1)
 
-            if not ocr_results:
-                continue
+# ---------------------------------------
+# Diagram pre-filter
+# ---------------------------------------
 
-            # Extract bounding boxes + text
-            boxes = []
-            for (bbox, text, conf) in ocr_results:
-                xs = [p[0] for p in bbox]
-                ys = [p[1] for p in bbox]
-                boxes.append((min(xs), min(ys), max(xs), max(ys), text))
+def diagram_features(image) -> DiagramFeatures:
+    """Edge density, colour flatness and text-like MSER regions of a BGR image."""
+    h, w = image.shape[:2]
+    scale = DIAGRAM_FEATURE_SIDE / max(h, w)
+    if scale < 1:
+        image = cv2.resize(
+            image, (max(1, round(w * scale)), max(1, round(h * scale))),
+            interpolation=cv2.INTER_AREA
+        )
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+    edges = cv2.Canny(gray, 100, 200)
+    edge_density = np.count_nonzero(edges) / edges.size
+
+    # 3 bits per channel -> 512 colour bins
+    q = (image >> 5).astype(np.intp)
+    bins = np.bincount(((q[..., 0] << 6) | (q[..., 1] << 3) | q[..., 2]).ravel(), minlength=512)
+    flat_colour = np.sort(bins)[-8:].sum() / gray.size
+
+    return DiagramFeatures(float(edge_density), float(flat_colour), _text_regions(gray))
+
+
+def _text_regions(gray) -> int:
+    """Number of distinct MSER regions shaped like a printed character."""
+    mser = cv2.MSER_create()
+    mser.setMinArea(15)
+    mser.setMaxArea(gray.size // 100 + 16)
+    # Rendered text is too crisp for MSER's stability test without a blur
+    _, boxes = mser.detectRegions(cv2.GaussianBlur(gray, (5, 5), 0))
+    if len(boxes) == 0:
+        return 0
+
+    boxes = np.unique(np.asarray(boxes), axis=0)
+    w, h = boxes[:, 2], boxes[:, 3]
+    text_like = (h >= 6) & (h <= gray.shape[0] * 0.2) & (w <= h * 5) & (w * 5 >= h)
+    return int(np.count_nonzero(text_like))
+
+
+def looks_like_diagram(image, features: DiagramFeatures = None) -> bool:
+    """
+    False for images unlikely to hold diagram text: near-blank images and
+    backgrounds (few edges), photographs (no dominant flat colours) and
+    images without character-sized regions.
+    """
+    if features is None:
+        features = diagram_features(image)
+    return (
+        features.edge_density >= DIAGRAM_MIN_EDGE_DENSITY
+        and features.flat_colour >= DIAGRAM_MIN_FLAT_COLOUR
+        and features.text_regions >= DIAGRAM_MIN_TEXT_REGIONS
+    )
 
-            if not boxes:
-                continue
 
-            # Cluster based on top-left coords
-            coords = np.array([[b[0], b[1], b[2], b[3]] for b in boxes])
-            
-            # Adaptive eps
-            eps_value = get_eps_for_image(width, height)
-            labels = DBSCAN(eps=eps_value, min_samples=1).fit(coords).labels_
+def ocr_image_stats() -> dict:
+    """Process-wide diagram OCR dedup and cache counters since start-up."""
+    with _stats_lock:
+        return dict(OCR_IMAGE_STATS)
 
-            groups = defaultdict(list)
-            for idx, label in enumerate(labels):
-                groups[label].append(boxes[idx])
 
-            # Extract text cluster-by-cluster
-            for label, group in groups.items():
-                sorted_group = sorted(group, key=lambda b: (b[1], b[0]))
-                raw_cluster_text = " ".join([b[4] for b in sorted_group]).strip()
-                cleaned_cluster_text = clean_ocr_text(raw_cluster_text)
-                if cleaned_cluster_text:
-                    extracted_texts.append(cleaned_cluster_text)
+def readtext_bucketed(diagrams, batch_size):
+    """
+    Yields (diagram, ocr_results) for every diagram, OCR'd with easyocr's
+    readtext_batched. Diagrams are bucketed by size rounded up to
+    OCR_BUCKET_STEP and padded (bottom/right, white) to their bucket's
+    shape, so boxes keep their original coordinates. A bucket is OCR'd as
+    soon as it holds `batch_size` images, which bounds decoded images held
+    in memory to one partial batch per bucket.
+    """
+    step = OCR_BUCKET_STEP
+    buckets = defaultdict(list)
+
+    for diagram in diagrams:
+        h, w = diagram.image.shape[:2]
+        shape = (-(-h // step) * step, -(-w // step) * step)
+        buckets[shape].append(diagram)
+        if len(buckets[shape]) >= batch_size:
+            yield from _readtext_batch(buckets.pop(shape), shape, batch_size)
+
+    for shape, batch in buckets.items():
+        yield from _readtext_batch(batch, shape, batch_size)
+
+
+def _readtext_batch(batch, shape, batch_size):
+    reader = get_ocr_reader()
+    if len(batch) == 1:
+        return [(batch[0], reader.readtext(batch[0].image, detail=1))]
+
+    height, width = shape
+    padded = [
+        cv2.copyMakeBorder(
+            d.image, 0, height - d.image.shape[0], 0, width - d.image.shape[1],
+            cv2.BORDER_CONSTANT, value=(255, 255, 255)
+        )
+        for d in batch
+    ]
+    results = reader.readtext_batched(padded, detail=1, batch_size=batch_size)
+    return list(zip(batch, results))
+
+
+def cluster_ocr_text(ocr_results, width, height) -> List[str]:
+    """Groups an image's OCR boxes spatially and returns each group's cleaned text."""
+    # Extract bounding boxes + text
+    boxes = []
+    for (bbox, text, conf) in ocr_results:
+        xs = [p[0] for p in bbox]
+        ys = [p[1] for p in bbox]
+        boxes.append((min(xs), min(ys), max(xs), max(ys), text))
+
+    if not boxes:
+        return []
+
+    # Adaptive eps
+    eps_value = get_eps_for_image(width, height)
+    groups = [[boxes[i] for i in group] for group in group_boxes(boxes, eps_value)]
+
+    # Extract text cluster-by-cluster
+    extracted_texts = []
+    for group in groups:
+        sorted_group = sorted(group, key=lambda b: (b[1], b[0]))
+        raw_cluster_text = " ".join([b[4] for b in sorted_group]).strip()
+        cleaned_cluster_text = clean_ocr_text(raw_cluster_text)
+        if cleaned_cluster_text:
+            extracted_texts.append(cleaned_cluster_text)
 
-            print(f"[✓] Extracted clustered text from diagram p{page_index + 1}-{img_index + 1}")
+    return extracted_texts
 
-    doc.close()
-    return "\n".join(extracted_texts)
+
+def group_boxes(boxes, eps) -> List[List[int]]:
+    """
+    Indices of `boxes` ((x0, y0, x1, y1, ...) tuples) grouped into the
+    clusters DBSCAN(eps, min_samples=1) finds on their corners: boxes are
+    linked when the euclidean distance of their corner vectors is <= eps,
+    and groups are the connected components. Groups come in DBSCAN's label
+    order (by lowest index), each in index order.
+
+    Boxes are bucketed in an eps-sized grid on (x0, y0); a linked box is
+    within eps on both, so only the 3x3 neighbouring cells are compared.
+
+    Distances are compared squared. That is exact for integer corners
+    (easyocr's), so boxes exactly eps apart link as in DBSCAN. With
+    float corners a distance equal to eps up to rounding may resolve
+    differently. benchmarks/check_group_boxes.py compares both.
+    """
+    n = len(boxes)
+    parent = list(range(n))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    eps_sq = eps * eps
+    grid = defaultdict(list)
+    for i, box in enumerate(boxes):
+        cx, cy = int(box[0] // eps), int(box[1] // eps)
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for j in grid.get((cx + dx, cy + dy), ()):
+                    other = boxes[j]
+                    d0 = box[0] - other[0]
+                    d1 = box[1] - other[1]
+                    d2 = box[2] - other[2]
+                    d3 = box[3] - other[3]
+                    if d0 * d0 + d1 * d1 + d2 * d2 + d3 * d3 <= eps_sq:
+                        ri, rj = find(i), find(j)
+                        if ri != rj:
+                            # The lower index stays root, so roots are first members
+                            parent[max(ri, rj)] = min(ri, rj)
+        grid[(cx, cy)].append(i)
+
+    groups = {}
+    for i in range(n):
+        groups.setdefault(find(i), []).append(i)
+    return list(groups.values())
 
 
 if __name__ == "__main__":
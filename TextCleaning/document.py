@@ -0,0 +1,281 @@
+"""
+document.py
+-----------
+Parses an uploaded PDF once and shares the result between validation,
+text cleaning, table extraction and diagram OCR.
+"""
+
+import hashlib
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+import fitz  # PyMuPDF
+import pdfplumber
+
+# Worker processes used for page-parallel text extraction (1 = serial)
+TEXT_EXTRACT_WORKERS = int(os.getenv("TEXT_EXTRACT_WORKERS", "1"))
+# Below this many pages the pool start-up costs more than it saves
+PARALLEL_MIN_PAGES = int(os.getenv("PARALLEL_MIN_PAGES", "64"))
+# Table detection is far slower per page than text, so the pool pays off
+# sooner. Opt-in like TEXT_EXTRACT_WORKERS: spawn workers re-import the
+# main module, so only enable pools when it has no start-up side effects.
+TABLE_EXTRACT_WORKERS = int(os.getenv("TABLE_EXTRACT_WORKERS", "1"))
+TABLE_PARALLEL_MIN_PAGES = int(os.getenv("TABLE_PARALLEL_MIN_PAGES", "16"))
+
+# Versions of the per-page extractors, used to key persisted results
+# (see extraction_cache.py). Bump the leading number when the extraction
+# itself changes; a library upgrade invalidates them on its own.
+TEXT_EXTRACTOR_VERSION = f"1-pymupdf{fitz.VersionBind}"
+TABLE_EXTRACTOR_VERSION = f"1-pdfplumber{pdfplumber.__version__}"
+
+
+class ParsedDocument:
+    """
+    A single open PDF with lazily filled per-page caches.
+
+    Every stage of the pipeline reads from the same object, so the file is
+    opened by fitz once (and by pdfplumber once, only if tables are needed):
+    - page text       -> page_text(i) / page_texts()
+    - image xrefs     -> page_images(i)
+    - vector drawings -> page_drawings(i)
+    - table candidates (raw pdfplumber tables) -> page_tables(i) / page_tables_batch()
+    """
+
+    def __init__(self, path: str = None, stream: bytes = None, name: str = None,
+                 delete_on_close: bool = False, digest: str = None):
+        if path is None and stream is None:
+            raise ValueError("ParsedDocument needs a path or a stream")
+
+        self.path = path
+        self.stream = stream
+        self.name = name or (os.path.basename(path) if path else "document.pdf")
+        # Spooled upload files are owned by the document and removed on close
+        self.delete_on_close = delete_on_close and path is not None
+        self._digest = digest
+
+        if stream is not None:
+            self.doc = fitz.open(stream=stream, filetype="pdf")
+        else:
+            self.doc = fitz.open(path)
+
+        self.page_count = self.doc.page_count
+
+        self._texts = [None] * self.page_count
+        self._images = [None] * self.page_count
+        self._drawings = [None] * self.page_count
+        self._tables = [None] * self.page_count
+        self._plumber = None
+
+    # ---------------------------
+    # Document level
+    # ---------------------------
+
+    @property
+    def is_encrypted(self) -> bool:
+        return bool(self.doc.needs_pass or self.doc.metadata.get("encryption"))
+
+    @property
+    def digest(self) -> str:
+        """SHA-256 of the PDF bytes (computed once unless the uploader supplied it)."""
+        if self._digest is None:
+            sha = hashlib.sha256()
+            if self.stream is not None:
+                sha.update(self.stream)
+            else:
+                with open(self.path, "rb") as f:
+                    for block in iter(lambda: f.read(1024 * 1024), b""):
+                        sha.update(block)
+            self._digest = sha.hexdigest()
+        return self._digest
+
+    @property
+    def plumber(self):
+        """pdfplumber handle, opened on first use and shared afterwards."""
+        if self._plumber is None:
+            if self.path is not None:
+                self._plumber = pdfplumber.open(self.path)
+            else:
+                self._plumber = pdfplumber.open(io.BytesIO(self.stream))
+        return self._plumber
+
+    # ---------------------------
+    # Per-page caches
+    # ---------------------------
+
+    def page_text(self, page_index: int) -> str:
+        if self._texts[page_index] is None:
+            self._texts[page_index] = self.doc[page_index].get_text("text")
+        return self._texts[page_index]
+
+    def page_texts(self, workers: int = None, page_indices=None) -> list:
+        """
+        Text of every page (or of `page_indices`), in page order.
+
+        With `workers` > 1 (TEXT_EXTRACT_WORKERS by default) and at least
+        PARALLEL_MIN_PAGES pages still missing, the missing pages are split
+        across a process pool; each worker opens its own fitz handle.
+        """
+        if workers is None:
+            workers = TEXT_EXTRACT_WORKERS
+        if page_indices is None:
+            page_indices = range(self.page_count)
+
+        missing = [i for i in page_indices if self._texts[i] is None]
+        if workers > 1 and len(missing) >= PARALLEL_MIN_PAGES:
+            texts = map_page_ranges(self, _extract_text_pages, missing, workers)
+            for page_index, text in zip(missing, texts):
+                self._texts[page_index] = text
+
+        return [self.page_text(i) for i in page_indices]
+
+    def page_images(self, page_index: int) -> list:
+        if self._images[page_index] is None:
+            self._images[page_index] = self.doc[page_index].get_images(full=True)
+        return self._images[page_index]
+
+    def page_drawings(self, page_index: int) -> list:
+        if self._drawings[page_index] is None:
+            self._drawings[page_index] = self.doc[page_index].get_drawings()
+        return self._drawings[page_index]
+
+    def page_tables(self, page_index: int) -> list:
+        if self._tables[page_index] is None:
+            self._tables[page_index] = self.plumber.pages[page_index].extract_tables()
+        return self._tables[page_index]
+
+    def page_tables_batch(self, page_indices, workers: int = None) -> list:
+        """
+        Raw tables of `page_indices`, in that order.
+
+        With `workers` > 1 (TABLE_EXTRACT_WORKERS by default) and at least
+        TABLE_PARALLEL_MIN_PAGES pages still missing, the missing pages are
+        split across a process pool; each worker opens its own pdfplumber handle.
+        """
+        if workers is None:
+            workers = TABLE_EXTRACT_WORKERS
+        page_indices = list(page_indices)
+
+        missing = [i for i in page_indices if self._tables[i] is None]
+        if workers > 1 and len(missing) >= TABLE_PARALLEL_MIN_PAGES:
+            tables = map_page_ranges(self, _extract_table_pages, missing, workers)
+            for page_index, page_tables in zip(missing, tables):
+                self._tables[page_index] = page_tables
+
+        return [self.page_tables(i) for i in page_indices]
+
+    # ---------------------------
+    # Lifecycle
+    # ---------------------------
+
+    def close(self):
+        if self._plumber is not None:
+            self._plumber.close()
+            self._plumber = None
+        if not self.doc.is_closed:
+            self.doc.close()
+        if self.delete_on_close and os.path.exists(self.path):
+            os.remove(self.path)
+            self.delete_on_close = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+@contextmanager
+def open_document(source):
+    """
+    Yields a ParsedDocument for `source`.
+
+    A ParsedDocument is passed through untouched (the caller owns it);
+    a path is opened here and closed when the block exits.
+    """
+    if isinstance(source, ParsedDocument):
+        yield source
+        return
+
+    document = ParsedDocument(path=source)
+    try:
+        yield document
+    finally:
+        document.close()
+
+
+# ---------------------------
+# Page-parallel helpers
+# ---------------------------
+
+def _open_fitz(path, stream):
+    if stream is not None:
+        return fitz.open(stream=stream, filetype="pdf")
+    return fitz.open(path)
+
+
+def _extract_text_pages(path, stream, page_indices):
+    """Worker: page.get_text("text") for `page_indices` on a private handle."""
+    doc = _open_fitz(path, stream)
+    try:
+        return [doc[i].get_text("text") for i in page_indices]
+    finally:
+        doc.close()
+
+
+def _extract_table_pages(path, stream, page_indices):
+    """Worker: pdfplumber extract_tables() for `page_indices` on a private handle."""
+    pdf = pdfplumber.open(path if stream is None else io.BytesIO(stream))
+    try:
+        return [pdf.pages[i].extract_tables() for i in page_indices]
+    finally:
+        pdf.close()
+
+
+# The document a pool worker was started for: (path, stream)
+_worker_source = (None, None)
+
+
+def _set_worker_source(path, stream):
+    """Pool initializer: keeps the document's path / bytes for every task."""
+    global _worker_source
+    _worker_source = (path, stream)
+
+
+def _run_on_source(worker_fn, page_indices):
+    path, stream = _worker_source
+    return worker_fn(path, stream, page_indices)
+
+
+def map_page_ranges(document, worker_fn, page_indices, workers):
+    """
+    Runs `worker_fn(path, stream, page_indices)` over contiguous slices of
+    `page_indices` in a spawn-based process pool and returns the per-page
+    results flattened back into the order of `page_indices`.
+
+    `worker_fn` must be a module-level function (it is pickled) and must
+    return one result per page it was given. The PDF bytes of an in-memory
+    document are sent to each worker once, not with every slice.
+    """
+    page_indices = list(page_indices)
+    if not page_indices:
+        return []
+
+    # A couple of slices per worker keeps the pool busy on uneven pages
+    n_slices = min(len(page_indices), workers * 2)
+    size = -(-len(page_indices) // n_slices)
+    slices = [page_indices[i:i + size] for i in range(0, len(page_indices), size)]
+
+    results = []
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=_set_worker_source,
+                             initargs=(document.path, document.stream)) as pool:
+        futures = [pool.submit(_run_on_source, worker_fn, pages) for pages in slices]
+        for future in futures:
+            results.extend(future.result())
+
+    return results
+
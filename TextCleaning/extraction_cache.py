@@ -0,0 +1,251 @@
+"""
+extraction_cache.py
+-------------------
+Persists per-page extraction results (page text, raw pdfplumber tables,
+diagram OCR text) in a small SQLite database, so a repeated run on the
+same PDF - e.g. while tuning keyword thresholds - skips fitz, pdfplumber
+and EasyOCR entirely.
+
+Rows are keyed by (document digest, page, extractor, version). Only raw
+extraction output is stored; cleaning and table filtering still run on
+every call, so changing their settings never needs a cache flush.
+
+A second table keys results by image content hash instead, so an image
+shared between documents (journal logos, banners) is OCR'd only once.
+
+Rows written more than EXTRACTION_CACHE_MAX_AGE_DAYS ago are dropped
+when the cache is opened; that also clears out rows of versions no
+longer in use.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Set EXTRACTION_CACHE_PATH to an empty string to disable the cache
+EXTRACTION_CACHE_PATH = os.getenv(
+    "EXTRACTION_CACHE_PATH", os.path.join(BASE_DIR, "../Cache/extraction.sqlite3")
+)
+# Rows older than this are pruned when the cache opens (0 = keep forever)
+EXTRACTION_CACHE_MAX_AGE_DAYS = float(os.getenv("EXTRACTION_CACHE_MAX_AGE_DAYS", "30"))
+
+# SQLite caps the number of bound parameters per statement
+_QUERY_PAGES = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    digest    TEXT    NOT NULL,
+    page      INTEGER NOT NULL,
+    extractor TEXT    NOT NULL,
+    version   TEXT    NOT NULL,
+    value     TEXT    NOT NULL,
+    created   REAL    NOT NULL,
+    PRIMARY KEY (digest, extractor, version, page)
+)
+"""
+
+_IMAGES_SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    digest    TEXT    NOT NULL,
+    extractor TEXT    NOT NULL,
+    version   TEXT    NOT NULL,
+    value     TEXT    NOT NULL,
+    created   REAL    NOT NULL,
+    PRIMARY KEY (digest, extractor, version)
+)
+"""
+
+
+class ExtractionCache:
+    """JSON values in one SQLite table; one connection per thread."""
+
+    def __init__(self, path: str, max_age_days: float = EXTRACTION_CACHE_MAX_AGE_DAYS):
+        self.path = path
+        self._local = threading.local()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connection() as conn:
+            conn.execute(_SCHEMA)
+            conn.execute(_IMAGES_SCHEMA)
+            conn.execute("CREATE INDEX IF NOT EXISTS pages_created ON pages (created)")
+            conn.execute("CREATE INDEX IF NOT EXISTS images_created ON images (created)")
+        if max_age_days > 0:
+            self.prune(max_age_days)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            # Readers never block the writer of another request
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get_pages(self, digest: str, extractor: str, version: str, pages) -> dict:
+        """Cached values of `pages` as {page: value}; missing pages are absent."""
+        pages = list(pages)
+        found = {}
+        conn = self._connection()
+        for i in range(0, len(pages), _QUERY_PAGES):
+            chunk = pages[i:i + _QUERY_PAGES]
+            rows = conn.execute(
+                "SELECT page, value FROM pages"
+                " WHERE digest = ? AND extractor = ? AND version = ?"
+                f" AND page IN ({','.join('?' * len(chunk))})",
+                (digest, extractor, version, *chunk),
+            )
+            for page, value in rows:
+                found[page] = json.loads(value)
+        return found
+
+    def put_pages(self, digest: str, extractor: str, version: str, values: dict):
+        """Stores {page: value}; values must be JSON-serialisable."""
+        now = time.time()
+        rows = [
+            (digest, page, extractor, version, json.dumps(value), now)
+            for page, value in values.items()
+        ]
+        with self._connection() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO pages"
+                " (digest, page, extractor, version, value, created)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+
+    def get_images(self, extractor: str, version: str, digests) -> dict:
+        """Cached values of image content `digests` as {digest: value}."""
+        digests = list(digests)
+        found = {}
+        conn = self._connection()
+        for i in range(0, len(digests), _QUERY_PAGES):
+            chunk = digests[i:i + _QUERY_PAGES]
+            rows = conn.execute(
+                "SELECT digest, value FROM images"
+                " WHERE extractor = ? AND version = ?"
+                f" AND digest IN ({','.join('?' * len(chunk))})",
+                (extractor, version, *chunk),
+            )
+            for digest, value in rows:
+                found[digest] = json.loads(value)
+        return found
+
+    def put_images(self, extractor: str, version: str, values: dict):
+        """Stores {image digest: value}; values must be JSON-serialisable."""
+        now = time.time()
+        rows = [
+            (digest, extractor, version, json.dumps(value), now)
+            for digest, value in values.items()
+        ]
+        with self._connection() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO images"
+                " (digest, extractor, version, value, created)"
+                " VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+
+    def prune(self, max_age_days: float) -> int:
+        """Drops rows written more than `max_age_days` ago; returns how many."""
+        cutoff = time.time() - max_age_days * 86400
+        with self._connection() as conn:
+            removed = conn.execute("DELETE FROM pages WHERE created < ?", (cutoff,)).rowcount
+            removed += conn.execute("DELETE FROM images WHERE created < ?", (cutoff,)).rowcount
+        if removed:
+            print(f"[INFO] Extraction cache: pruned {removed} rows older than {max_age_days:g} days")
+        return removed
+
+    def forget(self, digest: str = None):
+        """Drops the rows of one document (or image), or every row."""
+        with self._connection() as conn:
+            if digest is None:
+                conn.execute("DELETE FROM pages")
+                conn.execute("DELETE FROM images")
+            else:
+                conn.execute("DELETE FROM pages WHERE digest = ?", (digest,))
+                conn.execute("DELETE FROM images WHERE digest = ?", (digest,))
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_extraction_cache():
+    """The process-wide cache, or None when it is disabled or unusable."""
+    global _cache
+    if _cache is None and EXTRACTION_CACHE_PATH:
+        with _cache_lock:
+            if _cache is None:
+                try:
+                    _cache = ExtractionCache(EXTRACTION_CACHE_PATH)
+                except (sqlite3.Error, OSError) as e:
+                    logger.warning(f"Extraction cache disabled ({EXTRACTION_CACHE_PATH}): {e}")
+                    _cache = False
+    return _cache or None
+
+
+def cached_pages(document, extractor: str, version: str, compute, page_indices=None) -> list:
+    """
+    Per-page results of `extractor` for `page_indices` (all pages by default).
+
+    Pages found in the cache are returned as stored; the rest are computed
+    in one `compute(missing_pages)` call, which must return one
+    JSON-serialisable value per page, and written back. Cache failures
+    only cost the lookup: the pages are then simply computed.
+    """
+    if page_indices is None:
+        page_indices = range(document.page_count)
+    page_indices = list(page_indices)
+
+    cache = get_extraction_cache()
+    if cache is None or not page_indices:
+        return compute(page_indices)
+
+    try:
+        found = cache.get_pages(document.digest, extractor, version, page_indices)
+    except sqlite3.Error as e:
+        logger.warning(f"Extraction cache read failed: {e}")
+        found = {}
+
+    missing = [i for i in page_indices if i not in found]
+    if missing:
+        fresh = dict(zip(missing, compute(missing)))
+        try:
+            cache.put_pages(document.digest, extractor, version, fresh)
+        except sqlite3.Error as e:
+            logger.warning(f"Extraction cache write failed: {e}")
+        found.update(fresh)
+
+    return [found[i] for i in page_indices]
+
+
+def lookup_images(extractor: str, version: str, digests) -> dict:
+    """Cached per-image values as {digest: value}; {} when the cache is off or fails."""
+    cache = get_extraction_cache()
+    digests = list(digests)
+    if cache is None or not digests:
+        return {}
+    try:
+        return cache.get_images(extractor, version, digests)
+    except sqlite3.Error as e:
+        logger.warning(f"Extraction cache read failed: {e}")
+        return {}
+
+
+def store_images(extractor: str, version: str, values: dict):
+    """Persists {image digest: value}; a no-op when the cache is off or fails."""
+    cache = get_extraction_cache()
+    if cache is None or not values:
+        return
+    try:
+        cache.put_images(extractor, version, values)
+    except sqlite3.Error as e:
+        logger.warning(f"Extraction cache write failed: {e}")
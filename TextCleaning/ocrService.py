@@ -0,0 +1,268 @@
+"""
+ocrService.py
+-------------
+Runs EasyOCR in a small pool of dedicated local processes, so the
+torch/EasyOCR model is loaded OCR_SERVICE_WORKERS times in total instead
+of once per web worker.
+
+Start the service next to the web workers:
+    OCR_SERVICE_AUTHKEY=<secret> python -m TextCleaning.ocrService --address /tmp/evalai-ocr.sock --workers 2
+
+and set OCR_SERVICE_ADDRESS and OCR_SERVICE_AUTHKEY to the same values
+for the web workers.
+get_ocr_reader() (diagramText.py) then returns a RemoteOCRReader, which
+sends image arrays over the local socket and gets the readtext results
+back; grouping and cleaning of the results stay in the caller. Without
+OCR_SERVICE_ADDRESS, OCR runs in-process as before.
+
+Addresses: a file path is a Unix socket, \\\\.\\pipe\\<name> a Windows
+named pipe, and host:port a TCP socket on a loopback address (others
+are refused). Requests are pickles, so the service and its clients must
+share a secret OCR_SERVICE_AUTHKEY; the service does not start without one.
+"""
+
+import argparse
+import ipaddress
+import logging
+import multiprocessing
+import os
+import signal
+import stat
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+
+logger = logging.getLogger(__name__)
+
+# ---------------------------------------
+# Settings
+# ---------------------------------------
+# Where the service listens ("" = OCR in-process)
+OCR_SERVICE_ADDRESS = os.getenv("OCR_SERVICE_ADDRESS", "")
+# OCR processes in the service; each holds one model
+OCR_SERVICE_WORKERS = int(os.getenv("OCR_SERVICE_WORKERS", "1"))
+# Shared secret checked on every connection (required, no default)
+OCR_SERVICE_AUTHKEY = os.getenv("OCR_SERVICE_AUTHKEY", "").encode()
+# Load a local reader when the service cannot be reached (off: that
+# brings back one model per web worker, which the service exists to avoid)
+OCR_SERVICE_FALLBACK = os.getenv("OCR_SERVICE_FALLBACK", "0") == "1"
+
+# Reader methods a client may call
+_METHODS = ("readtext", "readtext_batched")
+
+
+def parse_address(address: str):
+    """'host:port' -> (host, port); anything else (socket path, pipe name) as is."""
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit() and not address.startswith("\\\\"):
+        return host, int(port)
+    return address
+
+
+def _require_authkey(authkey: bytes) -> bytes:
+    if not authkey:
+        raise ValueError("OCR_SERVICE_AUTHKEY is not set; the OCR service needs a shared secret")
+    return authkey
+
+
+def _is_loopback(host: str) -> bool:
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host.strip("[]")).is_loopback
+    except ValueError:
+        return False
+
+
+# ---------------------------------------
+# Client side (web workers)
+# ---------------------------------------
+
+class RemoteOCRReader:
+    """
+    Stands in for easyocr.Reader: readtext / readtext_batched run in the
+    OCR service. One short connection per call keeps it thread-safe.
+    If the service cannot be reached or drops the connection, the call
+    fails, or with OCR_SERVICE_FALLBACK=1 runs on an in-process reader.
+    """
+
+    def __init__(self, address: str = None, authkey: bytes = None):
+        self.address = parse_address(address or OCR_SERVICE_ADDRESS)
+        self.authkey = _require_authkey(authkey or OCR_SERVICE_AUTHKEY)
+
+    def readtext(self, image, **kwargs):
+        return self._call("readtext", image, **kwargs)
+
+    def readtext_batched(self, images, **kwargs):
+        return self._call("readtext_batched", images, **kwargs)
+
+    def _call(self, method, *args, **kwargs):
+        try:
+            with Client(self.address, authkey=self.authkey) as conn:
+                conn.send((method, args, kwargs))
+                ok, value = conn.recv()
+        except (OSError, EOFError, AuthenticationError) as e:
+            if not OCR_SERVICE_FALLBACK:
+                raise RuntimeError(f"OCR service at {self.address} failed: {e!r}") from e
+            logger.error(f"OCR service at {self.address} failed ({e!r}); OCR'ing in-process")
+            from TextCleaning.diagramText import get_local_ocr_reader
+            return getattr(get_local_ocr_reader(), method)(*args, **kwargs)
+
+        if not ok:
+            raise RuntimeError(f"OCR service failed: {value}")
+        return value
+
+
+# ---------------------------------------
+# Service side
+# ---------------------------------------
+
+def _load_reader():
+    """Pool initializer: every OCR process loads its model once, up front."""
+    from TextCleaning.diagramText import get_local_ocr_reader
+    get_local_ocr_reader()
+
+
+def _run_reader(method, args, kwargs):
+    from TextCleaning.diagramText import get_local_ocr_reader
+    return getattr(get_local_ocr_reader(), method)(*args, **kwargs)
+
+
+class _OCRPool:
+    """
+    The OCR processes behind the service. If one dies (OOM kill, crash in
+    torch), the executor is broken for good; the first job to see that
+    replaces it, so later jobs run on fresh processes.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._pool = self._new_pool()
+
+    def _new_pool(self):
+        context = multiprocessing.get_context("spawn")
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=context,
+                                   initializer=_load_reader)
+
+    def run(self, method, args, kwargs):
+        with self._lock:
+            pool = self._pool
+        try:
+            return pool.submit(_run_reader, method, args, kwargs).result()
+        except BrokenProcessPool:
+            # Not retried: the job may be what killed the process
+            self._replace(pool)
+            raise
+
+    def _replace(self, broken):
+        with self._lock:
+            if self._pool is not broken:
+                return  # another job already replaced it
+            print("[INFO] OCR service: an OCR process died, starting new ones")
+            broken.shutdown(wait=False, cancel_futures=True)
+            self._pool = self._new_pool()
+
+    def shutdown(self):
+        with self._lock:
+            self._pool.shutdown()
+
+
+def _serve_connection(conn, pool):
+    """Answers the requests of one client connection until it closes."""
+    with conn:
+        while True:
+            try:
+                method, args, kwargs = conn.recv()
+            except EOFError:
+                return
+
+            if method not in _METHODS:
+                conn.send((False, f"unknown method {method!r}"))
+                continue
+            try:
+                conn.send((True, pool.run(method, args, kwargs)))
+            except Exception as e:
+                logger.exception(f"OCR job failed: {method}")
+                conn.send((False, repr(e)))
+
+
+def _remove_stale_socket(path: str, authkey: bytes):
+    """
+    Removes a Unix socket left behind by a previous run, which would block
+    the bind. Refuses (ValueError) if `path` is not a socket or a service
+    still answers on it.
+    """
+    try:
+        mode = os.stat(path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise ValueError(f"{path} exists and is not a socket; refusing to remove it")
+
+    try:
+        with Client(path, authkey=authkey):
+            pass
+    except (ConnectionRefusedError, FileNotFoundError):
+        # Nobody listening: stale
+        os.remove(path)
+        return
+    except (OSError, EOFError, AuthenticationError):
+        pass
+    raise ValueError(f"Something is already listening on {path}; refusing to replace it")
+
+
+def serve(address: str = None, workers: int = None):
+    """
+    Runs the OCR service until interrupted. Jobs from all connections share
+    one queue in front of `workers` OCR processes, so OCR concurrency (and
+    memory) is set here, independently of the number of web workers.
+    """
+    address = parse_address(address or OCR_SERVICE_ADDRESS)
+    workers = workers or OCR_SERVICE_WORKERS
+    if not address:
+        raise ValueError("No OCR service address (set OCR_SERVICE_ADDRESS or pass --address)")
+    if isinstance(address, tuple) and not _is_loopback(address[0]):
+        raise ValueError(f"OCR service must listen on a loopback address, not {address[0]}")
+    authkey = _require_authkey(OCR_SERVICE_AUTHKEY)
+
+    if isinstance(address, str) and not address.startswith("\\\\"):
+        _remove_stale_socket(address, authkey)
+
+    pool = _OCRPool(workers)
+    try:
+        with Listener(address, authkey=authkey) as listener:
+            print(f"[INFO] OCR service listening on {address} with {workers} worker(s)")
+            while True:
+                try:
+                    conn = listener.accept()
+                except (OSError, EOFError, AuthenticationError) as e:
+                    # A client that fails the handshake must not stop the service
+                    logger.warning(f"OCR service: rejected connection ({e})")
+                    continue
+                threading.Thread(
+                    target=_serve_connection, args=(conn, pool), daemon=True
+                ).start()
+    finally:
+        pool.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Out-of-process EasyOCR service")
+    parser.add_argument("--address", default=OCR_SERVICE_ADDRESS,
+                        help="socket path, \\\\.\\pipe\\<name> or loopback host:port")
+    parser.add_argument("--workers", type=int, default=OCR_SERVICE_WORKERS,
+                        help="OCR processes (one model each)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    # Stop on SIGTERM like on Ctrl-C, so the pool shuts its OCR processes down
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        serve(args.address, args.workers)
+    except ValueError as e:
+        parser.error(str(e))
+    except KeyboardInterrupt:
+        pass
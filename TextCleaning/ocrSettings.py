@@ -0,0 +1,24 @@
+"""
+ocrSettings.py
+--------------
+EasyOCR engine settings shared by diagram OCR (diagramText.py) and
+full-page OCR (scannedText.py), and the engine part of the versions
+their cached results are stored under.
+"""
+
+from importlib.metadata import version, PackageNotFoundError
+import os
+
+# CPU by default: our nodes have no GPU
+OCR_GPU = os.getenv("OCR_GPU", "0") == "1"
+# int8 dynamic quantization of the detector/recognizer (CPU only)
+OCR_QUANTIZE = os.getenv("OCR_QUANTIZE", "1") != "0"
+
+try:
+    EASYOCR_VERSION = version("easyocr")
+except PackageNotFoundError:
+    # Web workers that OCR through the OCR service need not install easyocr
+    EASYOCR_VERSION = "unknown"
+
+# Engine and model variant behind every OCR result, for cache versions
+OCR_ENGINE_VERSION = f"easyocr{EASYOCR_VERSION}" + ("-q8" if OCR_QUANTIZE and not OCR_GPU else "")
@@ -0,0 +1,176 @@
+"""
+scannedText.py
+--------------
+Full-page OCR for scanned PDFs. Pages without a text layer but with an
+image (a scanned page) are rendered at a modest DPI and OCR'd, and the
+result stands in for their empty page text, so scans go through the
+normal cleaning path instead of producing an empty quiz.
+
+At most SCAN_PAGE_BUDGET pages are OCR'd per document, so one 300-page
+scan cannot hold a worker for an hour; on longer scans only the first
+pages are OCR'd whole, and the images of the rest still go through
+diagram OCR. OCR'd pages are persisted like any other extraction (see
+extraction_cache.py).
+"""
+
+import logging
+import os
+
+import fitz  # PyMuPDF
+import numpy as np
+
+from TextCleaning.document import map_page_ranges, _open_fitz, TEXT_EXTRACTOR_VERSION
+from TextCleaning.extraction_cache import cached_pages
+from TextCleaning.ocrSettings import OCR_ENGINE_VERSION
+
+logger = logging.getLogger(__name__)
+
+# ---------------------------------------
+# Settings
+# ---------------------------------------
+SCAN_OCR = os.getenv("SCAN_OCR", "1") == "1"
+# A page with fewer non-space characters than this has no usable text layer
+SCAN_MIN_PAGE_CHARS = int(os.getenv("SCAN_MIN_PAGE_CHARS", "20"))
+# ...and its images must cover at least this share of the page; a page
+# holding one figure stays on the diagram OCR path
+SCAN_MIN_IMAGE_COVERAGE = float(os.getenv("SCAN_MIN_IMAGE_COVERAGE", "0.5"))
+# Render resolution; 150 dpi keeps body text legible for easyocr
+SCAN_DPI = int(os.getenv("SCAN_DPI", "150"))
+# Most pages OCR'd per document (the first ones are kept)
+SCAN_PAGE_BUDGET = int(os.getenv("SCAN_PAGE_BUDGET", "40"))
+# Worker processes for page OCR (1 = in process, the default). Each worker
+# loads its own EasyOCR model and re-imports the main module (spawn), so
+# enable only outside the web process and well below the core count.
+SCAN_OCR_WORKERS = int(os.getenv("SCAN_OCR_WORKERS", "1"))
+# Below this many pages the model load in every worker costs more than it saves
+SCAN_PARALLEL_MIN_PAGES = int(os.getenv("SCAN_PARALLEL_MIN_PAGES", "8"))
+
+# Version of the OCR'd page texts persisted in extraction_cache.py
+SCAN_OCR_VERSION = f"1-{OCR_ENGINE_VERSION}-{SCAN_DPI}dpi"
+
+
+def scanned_page_indices(document, pages_text, page_indices=None) -> list:
+    """
+    Pages of `document` (or of `page_indices`) that look scanned: no text
+    layer, and images covering at least SCAN_MIN_IMAGE_COVERAGE of the
+    page. `pages_text` holds the text of every page, so the text layer is
+    read from it instead of being extracted again.
+    """
+    if page_indices is None:
+        page_indices = range(document.page_count)
+
+    return [
+        i for i in page_indices
+        if len("".join(pages_text[i].split())) < SCAN_MIN_PAGE_CHARS
+        and document.page_images(i)
+        and image_coverage(document, i) >= SCAN_MIN_IMAGE_COVERAGE
+    ]
+
+
+def image_coverage(document, page_index) -> float:
+    """
+    Share of the page area covered by its placed images (0..1). Images
+    only listed in the page resources (a shared logo) are not placed and
+    cover nothing; overlapping placements are counted once each.
+    """
+    page = document.doc[page_index]
+    page_area = page.rect.width * page.rect.height
+    if page_area <= 0:
+        return 0.0
+
+    covered = 0.0
+    for img in document.page_images(page_index):
+        for rect in page.get_image_rects(img[0]):
+            rect = rect & page.rect
+            if not rect.is_empty:
+                covered += rect.width * rect.height
+    return min(1.0, covered / page_area)
+
+
+def ocr_page_indices(document, pages_text=None) -> list:
+    """
+    The scanned pages fill_scanned_pages OCRs: the first SCAN_PAGE_BUDGET
+    of them, or none when SCAN_OCR is off. Without `pages_text`, page
+    texts come from the extraction cache the text path fills.
+    """
+    if not SCAN_OCR:
+        return []
+
+    if pages_text is None:
+        pages_text = cached_pages(
+            document, "fitz.text", TEXT_EXTRACTOR_VERSION,
+            lambda pages: document.page_texts(page_indices=pages)
+        )
+    return scanned_page_indices(document, pages_text)[:SCAN_PAGE_BUDGET]
+
+
+def fill_scanned_pages(document, pages_text, workers: int = None) -> list:
+    """
+    `pages_text` (one string per page of `document`) with the text of
+    scanned pages replaced by their OCR text, within SCAN_PAGE_BUDGET.
+    Returns `pages_text` unchanged when SCAN_OCR is off or nothing is scanned.
+    """
+    if not SCAN_OCR:
+        return pages_text
+
+    scanned = scanned_page_indices(document, pages_text)
+    if not scanned:
+        return pages_text
+
+    if len(scanned) > SCAN_PAGE_BUDGET:
+        logger.warning(
+            f"{document.name}: {len(scanned)} scanned pages, OCR'ing the first {SCAN_PAGE_BUDGET}; "
+            f"the images of the rest go through diagram OCR"
+        )
+        scanned = scanned[:SCAN_PAGE_BUDGET]
+
+    print(f"[INFO] OCR'ing {len(scanned)} scanned page(s) of {document.name}")
+    texts = cached_pages(
+        document, "easyocr.page", SCAN_OCR_VERSION,
+        lambda pages: ocr_pages(document, pages, workers=workers),
+        page_indices=scanned
+    )
+
+    pages_text = list(pages_text)
+    for page_index, text in zip(scanned, texts):
+        pages_text[page_index] = text
+    return pages_text
+
+
+def ocr_pages(document, page_indices, workers: int = None) -> list:
+    """
+    OCR text of each page in `page_indices`, in that order.
+
+    With `workers` > 1 (SCAN_OCR_WORKERS by default) and at least
+    SCAN_PARALLEL_MIN_PAGES pages, the pages are split across a process
+    pool; otherwise they are OCR'd here with the shared reader.
+    """
+    if workers is None:
+        workers = SCAN_OCR_WORKERS
+    page_indices = list(page_indices)
+
+    if workers > 1 and len(page_indices) >= SCAN_PARALLEL_MIN_PAGES:
+        return map_page_ranges(document, _ocr_page_range, page_indices, workers)
+
+    return [_ocr_page(document.doc, i) for i in page_indices]
+
+
+def _ocr_page_range(path, stream, page_indices):
+    """Worker: OCR text of `page_indices` on a private fitz handle."""
+    doc = _open_fitz(path, stream)
+    try:
+        return [_ocr_page(doc, i) for i in page_indices]
+    finally:
+        doc.close()
+
+
+def _ocr_page(doc, page_index) -> str:
+    """Renders one page in grayscale at SCAN_DPI and returns its text, one paragraph per block."""
+    # Imported here: the reader (and torch) load only when a scan shows up
+    from TextCleaning.diagramText import get_ocr_reader
+
+    pix = doc[page_index].get_pixmap(dpi=SCAN_DPI, colorspace=fitz.csGRAY, alpha=False)
+    image = np.frombuffer(pix.samples, np.uint8).reshape(pix.height, pix.stride)[:, :pix.width]
+
+    paragraphs = get_ocr_reader().readtext(image, detail=0, paragraph=True)
+    return "\n\n".join(paragraphs)
@@ -5,61 +5,138 @@ Extracts semantically meaningful tables from PDFs and converts them to text.
 Ignores purely numeric or non-informative tables.
 """
 
-import pdfplumber
+import numpy as np
 import pandas as pd
 import re
+import os
 import logging
+import threading
+from collections import Counter
+
+from TextCleaning.document import open_document, TABLE_EXTRACTOR_VERSION
+from TextCleaning.extraction_cache import cached_pages
 
 logging.basicConfig(level=logging.WARNING)
 logger = logging.getLogger(__name__)
 
+# Skip pdfplumber on pages whose vector graphics cannot form a ruled table
+TABLE_PREFILTER = os.getenv("TABLE_PREFILTER", "1") != "0"
+
+# pdfplumber's default "lines" strategy drops edges shorter than 1pt before
+# building cells; the slack absorbs fitz/pdfminer rounding differences.
+MIN_RULING_LENGTH = 1
+RULING_TOLERANCE = 0.5
+
+# Pages seen / skipped by the pre-filter / sent to pdfplumber, tables found
+TABLE_PAGE_STATS = Counter()
+_stats_lock = threading.Lock()
+
 
 # ---------------------------
 # Utility checks
 # ---------------------------
 
+NUMERIC_RE = re.compile(r"[-+]?\d*\.?\d+")
+
+
 def is_numeric(value):
     try:
         value = str(value).strip()
-        return bool(re.fullmatch(r"[-+]?\d*\.?\d+", value))
+        return bool(NUMERIC_RE.fullmatch(value))
     except:
         return False
 
 
+def numeric_mask(values: np.ndarray) -> np.ndarray:
+    """
+    is_numeric() over an array of stripped strings, without a regex:
+    at most one sign, only in front, then decimal digits with at most one
+    "." that is not the last character.
+    """
+    if not values.size:
+        return np.zeros(values.shape, dtype=bool)
+
+    signs = np.strings.count(values, "-") + np.strings.count(values, "+")
+    leading_sign = np.strings.startswith(values, "-") | np.strings.startswith(values, "+")
+    digits = np.strings.lstrip(np.strings.replace(values, ".", "", 1), "+-")
+    return (
+        np.strings.isdecimal(digits)
+        & ((signs == 0) | ((signs == 1) & leading_sign))
+        & (np.strings.count(values, ".") <= 1)
+        & ~np.strings.endswith(values, ".")
+    )
+
+
+# Characters str.split() breaks on within ASCII text
+ASCII_WHITESPACE = ["\t", "\n", "\r", "\x0b", "\x0c", "\x1c", "\x1d", "\x1e", "\x1f"]
+
+
+def collapse_whitespace(cells: np.ndarray) -> np.ndarray:
+    """Same as " ".join(cell.split()) for every cell of a NumPy string array."""
+    cells = np.strings.strip(cells)
+    try:
+        cells.astype("S")
+    except UnicodeEncodeError:
+        # Unicode whitespace is only known to str.split()
+        irregular = np.ones(cells.shape, dtype=bool)
+    else:
+        irregular = np.strings.find(cells, "  ") >= 0
+        for ch in ASCII_WHITESPACE:
+            irregular |= np.strings.find(cells, ch) >= 0
+
+    if irregular.any():
+        cells = cells.copy()
+        cells[irregular] = [" ".join(cell.split()) for cell in cells[irregular].tolist()]
+    return cells
+
+
+def _as_strings(values) -> np.ndarray:
+    """str(value).strip() of each value, as a NumPy string array."""
+    return np.strings.strip(np.asarray(values, dtype=object).astype(str))
+
+
+def _cell_strings(df: pd.DataFrame) -> np.ndarray:
+    """
+    Stripped strings of the values a `for col in df.columns: for val in
+    df[col]` loop visits. A duplicated header makes df[col] a DataFrame,
+    which iterates over its column labels, so such columns contribute
+    their labels (once per duplicate) instead of their cells.
+    """
+    duplicated = df.columns.duplicated(keep=False)
+    if not duplicated.any():
+        return _as_strings(df.to_numpy(dtype=object).ravel())
+
+    parts = []
+    for j, col in enumerate(df.columns):
+        if duplicated[j]:
+            parts.append(list(df[col].columns))
+        else:
+            parts.append(df.iloc[:, j].to_numpy(dtype=object))
+    return _as_strings(np.concatenate([np.asarray(p, dtype=object) for p in parts]))
+
+
 def numeric_ratio(df: pd.DataFrame) -> float:
     total_cells = df.size
     if total_cells == 0:
         return 1.0
 
-    numeric_cells = 0
-    for col in df.columns:
-        for val in df[col]:
-            if is_numeric(val):
-                numeric_cells += 1
-
+    numeric_cells = int(numeric_mask(_cell_strings(df)).sum())
     return numeric_cells / total_cells
 
 
 def has_textual_headers(df: pd.DataFrame) -> bool:
-    for col in df.columns:
-        col = str(col).strip()
-        if not is_numeric(col) and len(col) > 1:
-            return True
-    return False
+    headers = _as_strings(list(df.columns))
+    return bool((~numeric_mask(headers) & (np.strings.str_len(headers) > 1)).any())
 
 
 def semantic_richness(df: pd.DataFrame) -> bool:
-    text_lengths = []
-    for col in df.columns:
-        for val in df[col]:
-            val = str(val).strip()
-            if not is_numeric(val):
-                text_lengths.append(len(val))
-
-    if not text_lengths:
+    cells = _cell_strings(df)
+    text_lengths = np.strings.str_len(cells[~numeric_mask(cells)])
+
+    if not text_lengths.size:
         return False
 
-    avg_len = sum(text_lengths) / len(text_lengths)
+    avg_len = int(text_lengths.sum()) / text_lengths.size
     return avg_len > 5  # threshold for meaningful text
 
 
@@ -97,32 +174,135 @@ def is_meaningful_table(df: pd.DataFrame, numeric_threshold: float = 0.85) -> bo
 
 def table_to_text(df: pd.DataFrame) -> str:
     """Convert table to structured text with headers and content on the same line."""
-    headers = [str(h).strip() for h in df.columns]
-    rows_text = []
+    headers = _as_strings(list(df.columns))
+    if not df.size:
+        return ""
+
+    # Row-major, so pairs come out row by row; newlines and extra
+    # whitespace become a single space
+    cells = collapse_whitespace(df.to_numpy(dtype=object).astype(str))
+
+    # Include non-empty cells (both text and numeric); only 3-4 character
+    # cells can spell "nan"/"none", so only those are lowercased
+    placeholder = np.isin(np.strings.str_len(cells), (3, 4))
+    placeholder[placeholder] = np.isin(np.strings.lower(cells[placeholder]), ("nan", "none"))
+    keep = (cells != "") & ~placeholder
+
+    pairs = np.strings.add(np.strings.add(np.broadcast_to(headers, cells.shape), ": "), cells)
+    return "\n".join(pairs[keep].tolist())
+
+
+# ---------------------------
+# Page pre-filter
+# ---------------------------
+
+def _segment_rulings(p, q):
+    """(horizontal, vertical) edge counts for the segment p -> q."""
+    dx, dy = abs(q.x - p.x), abs(q.y - p.y)
+    min_len = MIN_RULING_LENGTH - RULING_TOLERANCE
+    horizontal = dy <= RULING_TOLERANCE and dx >= min_len
+    vertical = dx <= RULING_TOLERANCE and dy >= min_len
+    return int(horizontal), int(vertical)
+
+
+def count_rulings(drawings) -> tuple:
+    """
+    Counts the horizontal and vertical edges pdfplumber could build table
+    cells from (lines, rectangle sides, axis-aligned curve segments).
+    Over-counts rather than under-counts.
+    """
+    min_len = MIN_RULING_LENGTH - RULING_TOLERANCE
+    h = v = 0
+    for path in drawings:
+        for item in path["items"]:
+            kind = item[0]
+            if kind == "re":
+                rect = item[1]
+                h += 2 * (abs(rect.width) >= min_len)
+                v += 2 * (abs(rect.height) >= min_len)
+                continue
+
+            if kind == "l":
+                p, q = item[1], item[2]
+                dh, dv = _segment_rulings(p, q)
+                # pdfplumber files every non-horizontal line as vertical
+                dv = int(abs(q.y - p.y) >= min_len)
+            elif kind == "qu":
+                quad = item[1]
+                corners = [quad.ul, quad.ur, quad.lr, quad.ll, quad.ul]
+                dh = dv = 0
+                for a, b in zip(corners, corners[1:]):
+                    sh, sv = _segment_rulings(a, b)
+                    dh, dv = dh + sh, dv + sv
+            elif kind == "c":
+                # pdfminer keeps control points, so every leg may be an edge
+                points = item[1:]
+                dh = dv = 0
+                for a, b in zip(points, points[1:]):
+                    sh, sv = _segment_rulings(a, b)
+                    dh, dv = dh + sh, dv + sv
+            else:
+                continue
+
+            h += dh
+            v += dv
+    return h, v
+
+
+def may_contain_table(document, page_idx: int) -> bool:
+    """
+    False only for pages where pdfplumber's default (ruling-line) table
+    finder cannot find a table: a cell needs two horizontal and two
+    vertical edges.
+    """
+    h, v = count_rulings(document.page_drawings(page_idx))
+    return h >= 2 and v >= 2
+
+
+def _detect_tables(document, page_indices) -> list:
+    """Raw pdfplumber tables per page; pre-filtered pages yield []."""
+    if TABLE_PREFILTER:
+        candidates = [i for i in page_indices if may_contain_table(document, i)]
+    else:
+        candidates = list(page_indices)
+
+    found = dict(zip(candidates, document.page_tables_batch(candidates)))
+    results = [found.get(i, []) for i in page_indices]
+
+    skipped = len(page_indices) - len(candidates)
+    with _stats_lock:
+        TABLE_PAGE_STATS["pages"] += len(page_indices)
+        TABLE_PAGE_STATS["skipped"] += skipped
+        TABLE_PAGE_STATS["detected"] += len(candidates)
+        TABLE_PAGE_STATS["tables"] += sum(len(tables) for tables in results)
+    totals = table_page_stats()
+    print(f"[INFO] Table pre-filter: skipped {skipped} of {len(page_indices)} pages "
+          f"({totals['skipped']} of {totals['pages']} since start-up)")
+
+    return results
 
-    for _, row in df.iterrows():
-        # Add all header-content pairs for this row, each on a new line
-        for h, cell in zip(headers, row):
-            cell = str(cell).strip()
-            # Replace newlines and extra whitespace with a single space
-            cell = " ".join(cell.split())
-            # Include non-empty cells (both text and numeric)
-            if cell and cell.lower() not in ['nan', 'none', '']:
-                rows_text.append(f"{h}: {cell}")
 
-    return "\n".join(rows_text) if rows_text else ""
+def table_page_stats() -> dict:
+    """Process-wide pre-filter counters since start-up."""
+    with _stats_lock:
+        return dict(TABLE_PAGE_STATS)
 
 
 # ---------------------------
 # Main extraction logic
 # ---------------------------
 
-def extract_tables_pdfplumber(pdf_path: str, numeric_threshold: float = 0.85):
+def extract_tables_pdfplumber(pdf_path, numeric_threshold: float = 0.85):
     extracted_text = []
     try:
-        with pdfplumber.open(pdf_path) as pdf:
-            for page_idx, page in enumerate(pdf.pages):
-                tables = page.extract_tables()
+        with open_document(pdf_path) as document:
+            # Raw tables are persisted per page; filtering below always reruns
+            page_tables = cached_pages(
+                document, "pdfplumber.tables", TABLE_EXTRACTOR_VERSION,
+                lambda pages: _detect_tables(document, pages)
+            )
+
+            for page_idx, tables in enumerate(page_tables):
                 if not tables:
                     continue
                     
@@ -150,12 +330,12 @@ def extract_tables_pdfplumber(pdf_path: str, numeric_threshold: float = 0.85):
 # Public API (USE THIS)
 # ---------------------------
 
-def extract_meaningful_tables(pdf_path: str, numeric_threshold: float = 0.85, skip_tables: bool = False) -> str:
+def extract_meaningful_tables(pdf_path, numeric_threshold: float = 0.85, skip_tables: bool = False) -> str:
     """
     Extracts meaningful tables from a PDF and returns them as clean text.
     
     Args:
-        pdf_path: Path to the PDF file
+        pdf_path: Path to the PDF file, or an already parsed ParsedDocument
         numeric_threshold: Maximum ratio of numeric cells (0-1). Default 0.85 allows 
                           statistical/financial tables. Lower values are stricter.
         skip_tables: If True, completely skip table extraction and return empty string
@@ -1,126 +1,356 @@
-import fitz  # PyMuPDF
 import re
+from collections import Counter
+from TextCleaning.document import open_document, TEXT_EXTRACTOR_VERSION
+from TextCleaning.extraction_cache import cached_pages
+from TextCleaning.scannedText import fill_scanned_pages
 
-def extract_clean_text(pdf_path: str) -> str:
-    """Extracts and cleans text from a PDF for keyword extraction and quiz generation."""
+# ----------------------------
+# Streaming state sizes
+# ----------------------------
+# Characters removed after a TOC keyword, and the longest keyword prefix
+# ("table of contents" minus one char) that may sit at the end of a chunk
+TOC_SPAN = 1500
+TOC_HOLD = len("table of contents") - 1
+
+# Longest references heading plus the character its \b looks at
+REFS_HOLD = len("\nbibliography")
+
+# Letters that no step after the references cut can match or look past
+# (every pattern there is built from whitespace, digits, brackets,
+# punctuation, non-ASCII and the letters of "page"/"of"). Chunks are cut
+# just before one of them, so each chunk is cleaned exactly as it would
+# be inside the whole document.
+SAFE_CUT_CHARS = frozenset("bcdhijklmnqrstuvwxyzBCDHIJKLMNQRSTUVWXYZ")
+
+START_PATTERNS = [
+    r"\bchapter\s+1\b",
+    r"\b1\.\s+introduction\b",
+    r"\bintroduction\b",
+    r"\bi\.\s+introduction\b"
+]
+
+# ----------------------------
+# Precompiled, linear-time rules
+# ----------------------------
+# Possessive quantifiers (*+, ++) never give characters back, so each
+# rule scans its input once; every rewrite below matches exactly the spans
+# of the original pattern noted next to it.
+
+# \S+@\S+ : a whitespace-delimited token with an "@" after its first char
+EMAIL_RE = re.compile(r"(?<!\S)\S[^\s@]*+@\S+")
+
+# Keywords only; the TOC span and the references tail are cut by position
+# instead of (.|\n){0,1500} / (.|\n)*$
+TOC_RE = re.compile(r"table of contents|contents|list of figures|list of tables", re.IGNORECASE)
+REFS_RE = re.compile(r"\n(?:references|bibliography|works cited|appendix)\b", re.IGNORECASE)
+
+# A line holding only a number (see _drop_number_lines)
+NUMBER_LINE_RE = re.compile(r"^[^\S\n]*+\d++[^\S\n]*+$", re.MULTILINE)
+TRAILING_SPACE_RE = re.compile(r"\s*+")
+# page\s*\d+(\s*of\s*\d+)?
+PAGE_LABEL_RE = re.compile(r"page\s*+\d++(?:\s*+of\s*+\d++)?", re.IGNORECASE)
+# \[\d+(,\s*\d+)*\]
+CITATION_RE = re.compile(r"\[\d++(?:,\s*+\d++)*+\]")
+# -\s*\n\s*
+HYPHEN_BREAK_RE = re.compile(r"-[^\S\n]*+\n\s*+")
+LINE_BREAK_RE = re.compile(r"(?<!\n)\n(?!\n)")
+MULTI_SPACE_RE = re.compile(r"[ \t]{2,}")
+NON_ASCII_RE = re.compile(r"[^\x00-\x7F]+")
+MULTI_NEWLINE_RE = re.compile(r"\n{2,}")
+BULLET_RE = re.compile(r"[•▪●◦]")
+START_RES = [re.compile(pattern, re.IGNORECASE) for pattern in START_PATTERNS]
+
+
+def extract_clean_text(pdf_path, workers: int = None) -> str:
+    """
+    Extracts and cleans text from a PDF for keyword extraction and quiz generation.
+    `pdf_path` may also be a ParsedDocument, whose cached page text is reused.
+    `workers` > 1 extracts long documents page-parallel (see ParsedDocument.page_texts);
+    cleaning, including the header/footer pass, still sees the whole document.
+    Page text is persisted per page (see extraction_cache.py); cleaning is not.
+    Scanned pages without a text layer are OCR'd instead (see scannedText.py).
+    """
 
     # ----------------------------
     # 1. Extract text page-wise
     # ----------------------------
-    doc = fitz.open(pdf_path)
-    pages_text = [page.get_text("text") for page in doc]
-    doc.close()
-    full_text = "\n".join(pages_text)
+    with open_document(pdf_path) as document:
+        pages_text = cached_pages(
+            document, "fitz.text", TEXT_EXTRACTOR_VERSION,
+            lambda pages: document.page_texts(workers=workers, page_indices=pages)
+        )
+        pages_text = fill_scanned_pages(document, pages_text)
 
-    # ----------------------------
-    # 2. Remove repeated headers / footers
-    # ----------------------------
-    lines = [l.strip() for l in full_text.split("\n")]
-    freq = {}
-    for line in lines:
-        if len(line) < 4:
+    return clean_pages(pages_text)
+
+
+def clean_pages(pages_text) -> str:
+    """
+    Cleans page texts as one document, page by page.
+
+    Every step is a generator over small text chunks holding only a few
+    characters of rolling state, so no intermediate whole-document copies
+    are built; only the final cleaned text is joined. `pages_text` must be
+    re-iterable (e.g. a list of page strings), since the header/footer
+    frequencies need a cheap first pass over all lines.
+    """
+    freq = _line_frequencies(pages_text)
+
+    chunks = _kept_lines(pages_text, freq)
+    chunks = _strip_toc(chunks)
+    chunks = _cut_references(chunks)
+    chunks = _normalize(chunks)
+
+    return _from_main_content("".join(chunks))
+
+
+# ----------------------------
+# 2. Remove repeated headers / footers (first pass: frequencies)
+# ----------------------------
+def _line_frequencies(pages_text) -> Counter:
+    freq = Counter()
+    for page_text in pages_text:
+        freq.update([
+            line for line in map(str.strip, page_text.split("\n"))
+            if len(line) >= 4
+        ])
+    return freq
+
+
+def _kept_lines(pages_text, freq):
+    """
+    Yields the kept lines of each page as one chunk; the chunks concatenate
+    to "\\n".join(all kept lines).
+    """
+    kept_count = 0
+    for page_text in pages_text:
+        lines = [
+            line for line in map(str.strip, page_text.split("\n"))
+            if freq.get(line, 0) < 3
+        ]
+        if not lines:
             continue
-        freq[line] = freq.get(line, 0) + 1
-    lines = [l for l in lines if freq.get(l, 0) < 3]
 
-    # ----------------------------
-    # 3. Remove emails on page 1 only
-    # ----------------------------
-    if len(lines) > 0:
-        first_page_lines = lines[:100]
-        first_page_lines = [re.sub(r"\S+@\S+", "", l) for l in first_page_lines]
-        lines[:100] = first_page_lines
+        # ----------------------------
+        # 3. Remove emails on page 1 only (first 100 kept lines)
+        # ----------------------------
+        if kept_count < 100:
+            head = 100 - kept_count
+            lines[:head] = [EMAIL_RE.sub("", line) for line in lines[:head]]
 
-    text = "\n".join(lines)
+        kept_count += len(lines)
+        chunk = "\n".join(lines)
+        yield chunk if kept_count == len(lines) else "\n" + chunk
 
-    # ----------------------------
-    # 4. Remove TOC / Lists (robust)
-    # ----------------------------
-    text = re.sub(
-        r"(table of contents|contents|list of figures|list of tables)"
-        r"(.|\n){0,1500}",
-        "",
-        text,
-        flags=re.IGNORECASE
-    )
 
-    # ----------------------------
-    # 5. Remove References / Bibliography / Appendix
-    # ----------------------------
-    text = re.sub(
-        r"\n(references|bibliography|works cited|appendix)\b(.|\n)*$",
-        "",
-        text,
-        flags=re.IGNORECASE
-    )
+# ----------------------------
+# 4. Remove TOC / Lists (robust)
+# ----------------------------
+def _strip_toc(chunks):
+    """
+    Drops every TOC keyword plus the TOC_SPAN characters after it, the same
+    spans the whole-document `(keyword)(.|\\n){0,1500}` substitution removed.
+    """
+    buf = ""
+    skip = 0
+
+    for chunk in chunks:
+        if skip:
+            dropped = min(skip, len(chunk))
+            chunk = chunk[dropped:]
+            skip -= dropped
+            if not chunk:
+                continue
+
+        buf += chunk
+        pos = 0
+        out = []
+        while True:
+            match = TOC_RE.search(buf, pos)
+            if match is None:
+                break
+            out.append(buf[pos:match.start()])
+            end = match.end() + TOC_SPAN
+            if end >= len(buf):
+                # The rest of the span lies in chunks not read yet
+                skip = end - len(buf)
+                pos = len(buf)
+                break
+            pos = end
+
+        # Hold back a tail that may be the start of a split keyword
+        keep_from = max(pos, len(buf) - TOC_HOLD)
+        out.append(buf[pos:keep_from])
+        buf = buf[keep_from:]
+
+        text = "".join(out)
+        if text:
+            yield text
+
+    if buf:
+        yield buf
 
+
+# ----------------------------
+# 5. Remove References / Bibliography / Appendix
+# ----------------------------
+def _cut_references(chunks):
+    """
+    Ends the stream at the first line-leading references heading; nothing
+    after it is read or cleaned.
+    """
+    buf = ""
+
+    for chunk in chunks:
+        buf += chunk
+        match = REFS_RE.search(buf)
+
+        # \b at the very end of the buffer is only confirmed by more text
+        if match and match.end() < len(buf):
+            yield buf[:match.start()]
+            return
+
+        safe = len(buf) - REFS_HOLD
+        if match:
+            safe = min(safe, match.start())
+        if safe > 0:
+            yield buf[:safe]
+            buf = buf[safe:]
+
+    match = REFS_RE.search(buf)
+    if match:
+        buf = buf[:match.start()]
+    if buf:
+        yield buf
+
+
+# ----------------------------
+# 6-12, 14. Character-level cleanup
+# ----------------------------
+def _normalize(chunks):
+    """
+    Applies the remaining substitutions chunk by chunk. Each chunk is cut
+    just before a SAFE_CUT_CHARS letter, which is carried over as one
+    character of context so lookarounds and `$` see what they would see in
+    the whole document.
+    """
+    buf = ""
+
+    for chunk in chunks:
+        buf += chunk
+
+        cut = len(buf) - 1
+        while cut > 0 and buf[cut] not in SAFE_CUT_CHARS:
+            cut -= 1
+        if cut <= 0:
+            continue
+
+        # buf[cut] is never matched, so it survives every step unchanged
+        yield _normalize_text(buf[:cut + 1])[:-1]
+        buf = buf[cut:]
+
+    if buf:
+        yield _normalize_text(buf)
+
+
+def _normalize_text(text: str) -> str:
     # ----------------------------
     # 6. Remove page numbers
     # ----------------------------
-    text = re.sub(r"^\s*\d+\s*$", "", text, flags=re.MULTILINE)
-    text = re.sub(r"page\s*\d+(\s*of\s*\d+)?", "", text, flags=re.IGNORECASE)
+    text = _drop_number_lines(text)
+    text = PAGE_LABEL_RE.sub("", text)
 
     # ----------------------------
     # 7. Remove citation numbers like [1], [2,3]
     # ----------------------------
-    text = re.sub(r"\[\d+(,\s*\d+)*\]", "", text)
+    text = CITATION_RE.sub("", text)
 
     # ----------------------------
     # 8. Fix hyphenated line breaks and merge broken lines
     # ----------------------------
-    text = re.sub(r"-\s*\n\s*", "", text)
-    text = re.sub(r"(?<!\n)\n(?!\n)", " ", text)
-
-    # ----------------------------
-    # 9. Remove bullet symbols
-    # ----------------------------
-    text = re.sub(r"[•▪●◦]", "", text)
+    text = HYPHEN_BREAK_RE.sub("", text)
+    text = LINE_BREAK_RE.sub(" ", text)
 
     # ----------------------------
-    # 10. Normalize punctuation
+    # 9-10. Remove bullet symbols, normalize punctuation (ASCII has none)
     # ----------------------------
-    text = (
-        text.replace("–", "-")
-            .replace("—", "-")
-            .replace("“", '"')
-            .replace("”", '"')
-    )
+    if not text.isascii():
+        text = BULLET_RE.sub("", text)
+        text = (
+            text.replace("–", "-")
+                .replace("—", "-")
+                .replace("“", '"')
+                .replace("”", '"')
+        )
 
     # ----------------------------
     # 11. Clean extra spaces
     # ----------------------------
-    text = re.sub(r"[ \t]{2,}", " ", text)
+    text = MULTI_SPACE_RE.sub(" ", text)
 
     # ----------------------------
     # 12. Remove non-ASCII noise
     # ----------------------------
-    text = re.sub(r"[^\x00-\x7F]+", " ", text)
+    text = NON_ASCII_RE.sub(" ", text)
 
     # ----------------------------
-    # 13. START FROM MAIN CONTENT (FIXED)
+    # 14. Final cleanup of newlines (runs never span a chunk cut, and
+    #     collapsing them first does not move where main content starts)
     # ----------------------------
-    START_PATTERNS = [
-        r"\bchapter\s+1\b",
-        r"\b1\.\s+introduction\b",
-        r"\bintroduction\b",
-        r"\bi\.\s+introduction\b"
-    ]
+    text = MULTI_NEWLINE_RE.sub("\n\n", text)
+    return text
+
+
+def _drop_number_lines(text: str) -> str:
+    """
+    Linear equivalent of re.sub(r"^\s*\d+\s*$", "", text, flags=re.M).
+
+    Because \s also matches newlines, that regex retries from every line
+    of a blank run and rescans the run each time (quadratic on long runs).
+    Its matches are: the blank lines before a number-only line (from the
+    first line start after the previous match), the number line itself and
+    the whitespace after it up to, not including, the last newline before
+    the next text.
+    """
+    n = len(text)
+    out = []
+    last = 0
+    for match in NUMBER_LINE_RE.finditer(text):
+        start, line_end = match.span()
+
+        # Extend back over the blank lines before it
+        blank = last + len(text[last:start].rstrip())
+        if blank == 0 or text[blank - 1] == "\n":
+            start = blank
+        else:
+            start = text.index("\n", blank) + 1
+
+        # ... and forward over the whitespace after it
+        text_at = TRAILING_SPACE_RE.match(text, line_end).end()
+        end = n if text_at == n else text.rfind("\n", line_end, text_at)
 
+        out.append(text[last:start])
+        last = end
+
+    if not out:
+        return text
+    out.append(text[last:])
+    return "".join(out)
+
+
+# ----------------------------
+# 13. START FROM MAIN CONTENT (FIXED)
+# ----------------------------
+def _from_main_content(text: str) -> str:
     def find_main_start(text):
-        for pattern in START_PATTERNS:
-            match = re.search(pattern, text, flags=re.IGNORECASE)
+        for pattern in START_RES:
+            match = pattern.search(text)
             if match:
                 return match.start()
         return 0  # fallback if nothing found
 
     start_idx = find_main_start(text)
-    text = text[start_idx:]
-
-    # ----------------------------
-    # 14. Final cleanup of newlines
-    # ----------------------------
-    text = re.sub(r"\n{2,}", "\n\n", text).strip()
-    return text
+    return text[start_idx:].strip()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,137 @@
+"""
+bench_diagram_filter.py
+-----------------------
+Measures the diagram pre-filter in TextCleaning/diagramText.py: how many
+easyocr calls it avoids against how many diagram keywords it loses.
+
+Every distinct candidate image (the same size limits as extract_from_pdf)
+is classified; with OCR enabled every image is also OCR'd, and a keyword
+counts as lost when it only appears in the texts of dropped images.
+Thresholds default to the DIAGRAM_MIN_* settings and can be overridden
+here to tune them. The filter itself ships off (DIAGRAM_FILTER=0); run
+this on a representative corpus before turning it on.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_diagram_filter Uploads/              # every *.pdf in a folder
+    python -m benchmarks.bench_diagram_filter a.pdf --min-flat-colour 0.3
+    python -m benchmarks.bench_diagram_filter Uploads/ --no-ocr     # classification only
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+
+import TextCleaning.diagramText as diagram_text
+from TextCleaning.document import ParsedDocument
+
+
+# ---------------------------
+# Inputs
+# ---------------------------
+
+def corpus_images(paths, min_width, min_height):
+    """
+    Yields (name, decoded image, (width, height)) for every distinct
+    candidate image in `paths`, decoded as the pipeline decodes it.
+    """
+    seen = set()
+    for path in paths:
+        if os.path.isdir(path):
+            files = sorted(glob.glob(os.path.join(path, "**", "*.pdf"), recursive=True))
+        else:
+            files = [path]
+        for pdf in files:
+            with ParsedDocument(path=pdf) as document:
+                candidates = {}
+                for page_index in range(document.page_count):
+                    for img_index, img in enumerate(document.page_images(page_index)):
+                        diagram_text._image_key(
+                            document, img[0], page_index, img_index,
+                            min_width, min_height, candidates
+                        )
+                for key, (page_index, img_index, img_bytes, width, height) in candidates.items():
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    image = diagram_text.decode_image(
+                        img_bytes, width, height, diagram_text.OCR_MAX_SIDE
+                    )
+                    if image is not None:
+                        name = f"{os.path.basename(pdf)} p{page_index + 1}-{img_index + 1}"
+                        yield name, image, (width, height)
+
+
+# ---------------------------
+# Measurement
+# ---------------------------
+
+def keywords(texts):
+    return {word for text in texts for word in text.split()}
+
+
+def run(images, use_ocr):
+    reader = diagram_text.get_ocr_reader() if use_ocr else None
+    kept_words, dropped_words = set(), set()
+    n_images = n_dropped = 0
+    t_classify = t_ocr_kept = t_ocr_dropped = 0.0
+
+    print(f"{'image':<36} {'edges':>7} {'flat':>6} {'regions':>8}  {'verdict':<7} keywords")
+    for name, image, (width, height) in images:
+        start = time.perf_counter()
+        features = diagram_text.diagram_features(image)
+        keep = diagram_text.looks_like_diagram(image, features)
+        t_classify += time.perf_counter() - start
+
+        words = set()
+        if use_ocr:
+            start = time.perf_counter()
+            results = reader.readtext(image, detail=1)
+            diagram = diagram_text.Diagram(None, 0, 0, image, width, height)
+            results = diagram_text._to_original_scale(results, diagram)
+            texts = diagram_text.cluster_ocr_text(results, width, height) if results else []
+            elapsed = time.perf_counter() - start
+            words = keywords(texts)
+            if keep:
+                t_ocr_kept += elapsed
+            else:
+                t_ocr_dropped += elapsed
+
+        n_images += 1
+        n_dropped += not keep
+        (kept_words if keep else dropped_words).update(words)
+        print(f"{name[:36]:<36} {features.edge_density:7.4f} {features.flat_colour:6.3f} "
+              f"{features.text_regions:8d}  {'ocr' if keep else 'skip':<7} {' '.join(sorted(words))[:60]}")
+
+    print(f"\n{n_images} images: {n_dropped} OCR calls avoided "
+          f"({n_dropped / max(n_images, 1):.0%}), classification {t_classify:.2f}s")
+    if use_ocr:
+        lost = dropped_words - kept_words
+        total = kept_words | dropped_words
+        print(f"OCR time: kept {t_ocr_kept:.2f}s, avoided {t_ocr_dropped:.2f}s")
+        print(f"keywords: {len(total)} total, {len(lost)} lost"
+              + (f": {' '.join(sorted(lost))}" if lost else ""))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("paths", nargs="+", help="PDF files or folders of PDFs")
+    parser.add_argument("--min-width", type=int, default=150)
+    parser.add_argument("--min-height", type=int, default=150)
+    parser.add_argument("--min-edge-density", type=float, default=diagram_text.DIAGRAM_MIN_EDGE_DENSITY)
+    parser.add_argument("--min-flat-colour", type=float, default=diagram_text.DIAGRAM_MIN_FLAT_COLOUR)
+    parser.add_argument("--min-text-regions", type=int, default=diagram_text.DIAGRAM_MIN_TEXT_REGIONS)
+    parser.add_argument("--no-ocr", action="store_true", help="classify only (no easyocr needed)")
+    args = parser.parse_args(argv)
+
+    diagram_text.DIAGRAM_MIN_EDGE_DENSITY = args.min_edge_density
+    diagram_text.DIAGRAM_MIN_FLAT_COLOUR = args.min_flat_colour
+    diagram_text.DIAGRAM_MIN_TEXT_REGIONS = args.min_text_regions
+
+    run(corpus_images(args.paths, args.min_width, args.min_height), not args.no_ocr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""
+bench_noun_phrases.py
+---------------------
+Compares noun-phrase extraction with the full en_core_web_sm pipeline in
+one nlp(text) call (the original) against extract_noun_phrases in
+ContextExtraction/keywords_text.py (NER and lemmatizer disabled,
+paragraph chunks through nlp.pipe): ranking equality and time per paper.
+
+Inputs are cleaned with the normal text path, so numbers match what
+keyword extraction sees. Papers longer than spaCy's max_length cannot be
+run the original way and are timed on the new path only.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_noun_phrases Uploads/
+    python -m benchmarks.bench_noun_phrases thesis.pdf --repeat 3 --chunk-chars 50000
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+
+import ContextExtraction.keywords_text as keywords_text
+from ModelRegistry.registry import get_model, SPACY_MODEL
+from TextCleaning.textCleaner import extract_clean_text
+
+
+def legacy_noun_phrases(text):
+    """extract_noun_phrases as it was: the whole pipeline over the whole text."""
+    doc = get_model(SPACY_MODEL)(text)
+    phrases = []
+    for chunk in doc.noun_chunks:
+        phrase = chunk.text.lower().strip()
+        words = phrase.split()
+        if len(words) < keywords_text.MIN_PHRASE_LEN or len(words) > keywords_text.MAX_PHRASE_LEN:
+            continue
+        if not any(tok.pos_ in ("NOUN", "PROPN") for tok in chunk):
+            continue
+        if chunk[0].is_stop or chunk[-1].is_stop:
+            continue
+        phrases.append(phrase)
+    return phrases
+
+
+def corpus_texts(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            files = sorted(glob.glob(os.path.join(path, "**", "*.pdf"), recursive=True))
+        else:
+            files = [path]
+        for pdf in files:
+            yield os.path.basename(pdf), extract_clean_text(pdf) or ""
+
+
+def best_of(fn, text, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(text)
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("paths", nargs="+", help="PDF files or folders of PDFs")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per input (best is kept)")
+    parser.add_argument("--chunk-chars", type=int, default=keywords_text.NLP_CHUNK_CHARS)
+    parser.add_argument("--processes", type=int, default=keywords_text.NLP_PROCESSES)
+    args = parser.parse_args(argv)
+
+    keywords_text.NLP_CHUNK_CHARS = args.chunk_chars
+    keywords_text.NLP_PROCESSES = args.processes
+    nlp = get_model(SPACY_MODEL)
+
+    mismatches = 0
+    print(f"{'input':<32} {'chars':>9} {'old s':>8} {'new s':>8} {'speedup':>8}  same ranking")
+    for name, text in corpus_texts(args.paths):
+        new, t_new = best_of(keywords_text.extract_noun_phrases, text, args.repeat)
+        new_ranking = keywords_text.rank_phrases(new, keywords_text.TEXT_TOP_N)
+
+        if len(text) > nlp.max_length:
+            print(f"{name[:32]:<32} {len(text):9d} {'-':>8} {t_new:8.2f} {'-':>8}  (too long for one nlp() call)")
+            continue
+
+        old, t_old = best_of(legacy_noun_phrases, text, args.repeat)
+        same = keywords_text.rank_phrases(old, keywords_text.TEXT_TOP_N) == new_ranking
+        mismatches += not same
+        print(f"{name[:32]:<32} {len(text):9d} {t_old:8.2f} {t_new:8.2f} "
+              f"{t_old / max(t_new, 1e-9):7.1f}x  {'yes' if same else 'NO'}")
+
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,157 @@
+"""
+bench_text_cleaning.py
+----------------------
+Compares the original whole-document text cleaner with the streaming,
+linear-time one in TextCleaning/textCleaner.py: output equality and
+throughput over a corpus of PDFs, plus synthetic inputs that made the old
+regexes backtrack quadratically.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_text_cleaning Uploads/            # every *.pdf in a folder
+    python -m benchmarks.bench_text_cleaning a.pdf b.pdf --repeat 5
+    python -m benchmarks.bench_text_cleaning --synthetic
+
+Exits with status 1 if any output differs.
+"""
+
+import argparse
+import glob
+import os
+import re
+import sys
+import time
+
+import fitz  # PyMuPDF
+
+from TextCleaning.textCleaner import clean_pages
+
+
+def legacy_clean_pages(pages_text) -> str:
+    """The cleaner as it was before streaming (reference output)."""
+    full_text = "\n".join(pages_text)
+
+    lines = [l.strip() for l in full_text.split("\n")]
+    freq = {}
+    for line in lines:
+        if len(line) < 4:
+            continue
+        freq[line] = freq.get(line, 0) + 1
+    lines = [l for l in lines if freq.get(l, 0) < 3]
+
+    if len(lines) > 0:
+        lines[:100] = [re.sub(r"\S+@\S+", "", l) for l in lines[:100]]
+
+    text = "\n".join(lines)
+    text = re.sub(
+        r"(table of contents|contents|list of figures|list of tables)(.|\n){0,1500}",
+        "", text, flags=re.IGNORECASE
+    )
+    text = re.sub(
+        r"\n(references|bibliography|works cited|appendix)\b(.|\n)*$",
+        "", text, flags=re.IGNORECASE
+    )
+    text = re.sub(r"^\s*\d+\s*$", "", text, flags=re.MULTILINE)
+    text = re.sub(r"page\s*\d+(\s*of\s*\d+)?", "", text, flags=re.IGNORECASE)
+    text = re.sub(r"\[\d+(,\s*\d+)*\]", "", text)
+    text = re.sub(r"-\s*\n\s*", "", text)
+    text = re.sub(r"(?<!\n)\n(?!\n)", " ", text)
+    text = re.sub(r"[•▪●◦]", "", text)
+    text = text.replace("–", "-").replace("—", "-").replace("“", '"').replace("”", '"')
+    text = re.sub(r"[ \t]{2,}", " ", text)
+    text = re.sub(r"[^\x00-\x7F]+", " ", text)
+
+    for pattern in [r"\bchapter\s+1\b", r"\b1\.\s+introduction\b",
+                    r"\bintroduction\b", r"\bi\.\s+introduction\b"]:
+        match = re.search(pattern, text, flags=re.IGNORECASE)
+        if match:
+            text = text[match.start():]
+            break
+
+    return re.sub(r"\n{2,}", "\n\n", text).strip()
+
+
+# ---------------------------
+# Inputs
+# ---------------------------
+
+def corpus_pages(paths):
+    """Yields (name, page texts) for every PDF in `paths` (files or folders)."""
+    for path in paths:
+        if os.path.isdir(path):
+            files = sorted(glob.glob(os.path.join(path, "**", "*.pdf"), recursive=True))
+        else:
+            files = [path]
+        for pdf in files:
+            with fitz.open(pdf) as doc:
+                yield os.path.basename(pdf), [page.get_text("text") for page in doc]
+
+
+def synthetic_pages(size):
+    """Inputs that hit the worst cases of the old patterns."""
+    return [
+        ("blank-line runs", ["\n" * size + "Body text\n"] * 4),
+        ("long tokens", ["a" * size + " " + "b" * size + "\nintro"]),
+        ("number lines", ["\n\n".join(str(i) for i in range(size // 4))]),
+        ("no toc keyword", ["word " * size]),
+    ]
+
+
+# ---------------------------
+# Timing
+# ---------------------------
+
+def best_of(fn, pages, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(pages)
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def run(cases, repeat):
+    mismatches = 0
+    total_mb = total_old = total_new = 0.0
+
+    print(f"{'input':<32} {'MB':>7} {'old s':>9} {'new s':>9} {'old MB/s':>9} {'new MB/s':>9}  same")
+    for name, pages in cases:
+        mb = sum(len(p.encode("utf-8")) for p in pages) / 1e6
+        old, t_old = best_of(legacy_clean_pages, pages, repeat)
+        new, t_new = best_of(clean_pages, pages, repeat)
+        same = old == new
+        mismatches += not same
+
+        total_mb += mb
+        total_old += t_old
+        total_new += t_new
+        print(f"{name[:32]:<32} {mb:7.2f} {t_old:9.4f} {t_new:9.4f} "
+              f"{mb / max(t_old, 1e-9):9.2f} {mb / max(t_new, 1e-9):9.2f}  {'yes' if same else 'NO'}")
+
+    if total_old and total_new:
+        print(f"\ntotal {total_mb:.2f} MB: old {total_mb / total_old:.2f} MB/s, "
+              f"new {total_mb / total_new:.2f} MB/s")
+    return mismatches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("paths", nargs="*", help="PDF files or folders of PDFs")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per input (best is kept)")
+    parser.add_argument("--synthetic", action="store_true", help="add pathological inputs")
+    parser.add_argument("--size", type=int, default=8000, help="size of synthetic inputs")
+    args = parser.parse_args(argv)
+
+    cases = list(corpus_pages(args.paths))
+    if args.synthetic or not cases:
+        cases += synthetic_pages(args.size)
+
+    mismatches = run(cases, args.repeat)
+    if mismatches:
+        print(f"\n{mismatches} input(s) cleaned differently")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
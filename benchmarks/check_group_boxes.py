@@ -0,0 +1,114 @@
+"""
+check_group_boxes.py
+--------------------
+Checks that group_boxes in TextCleaning/diagramText.py (grid union-find)
+groups OCR boxes exactly as the DBSCAN(eps, min_samples=1) it replaced,
+on a fixed fixture set plus seeded random layouts, and times both.
+
+Fixtures cover chains linked through intermediate boxes, boxes exactly
+eps apart, boxes just over eps apart, grid-cell borders and negative
+coordinates. Integer coordinates (what easyocr returns) must match
+exactly. Float layouts are compared too; there the two may differ only
+when a distance equals eps up to rounding, which the random layouts
+almost never hit.
+
+Usage (from the repo root):
+    python -m benchmarks.check_group_boxes
+    python -m benchmarks.check_group_boxes --random 2000 --seed 1
+"""
+
+import argparse
+import random
+import sys
+import time
+
+import numpy as np
+from sklearn.cluster import DBSCAN
+
+from TextCleaning.diagramText import group_boxes
+
+
+def box(x0, y0, x1, y1):
+    return (x0, y0, x1, y1, "text", 0.9)
+
+
+# (name, eps, boxes)
+FIXTURES = [
+    ("empty", 40, []),
+    ("single", 40, [box(0, 0, 50, 20)]),
+    ("identical", 40, [box(10, 10, 60, 30), box(10, 10, 60, 30)]),
+    ("exactly eps apart", 40, [box(0, 0, 100, 20), box(40, 0, 140, 20)]),
+    ("one over eps", 40, [box(0, 0, 100, 20), box(41, 0, 141, 20)]),
+    # 20^2 * 4 = 1600 = 40^2: a tie spread over all four coordinates
+    ("tie on every coordinate", 40, [box(0, 0, 100, 20), box(20, 20, 120, 40)]),
+    ("chain", 40, [box(0, 0, 50, 20), box(30, 0, 80, 20), box(60, 0, 110, 20), box(90, 0, 140, 20)]),
+    ("chain out of order", 40, [box(90, 0, 140, 20), box(0, 0, 50, 20), box(60, 0, 110, 20), box(30, 0, 80, 20)]),
+    ("cell border", 40, [box(39, 39, 80, 60), box(40, 40, 81, 61), box(79, 79, 120, 100)]),
+    ("two lines", 80, [box(0, 0, 60, 20), box(70, 0, 130, 20), box(0, 200, 60, 220), box(70, 200, 130, 220)]),
+    ("far corners only", 120, [box(0, 0, 10, 10), box(0, 0, 400, 300)]),
+    ("negative coordinates", 40, [box(-50, -10, 0, 10), box(-20, -10, 30, 10), box(500, 500, 550, 520)]),
+]
+
+
+def dbscan_groups(boxes, eps):
+    """The original clustering: DBSCAN labels grouped in label order."""
+    if not boxes:
+        return []
+    corners = np.array([b[:4] for b in boxes], dtype=float)
+    labels = DBSCAN(eps=eps, min_samples=1).fit(corners).labels_
+    groups = {}
+    for i, label in enumerate(labels):
+        groups.setdefault(label, []).append(i)
+    return [groups[label] for label in sorted(groups)]
+
+
+def random_layout(rng, integer):
+    n = rng.randint(1, 120)
+    eps = rng.choice((40, 80, 120))
+    side = rng.choice((300, 900, 2500))
+    boxes = []
+    for _ in range(n):
+        x0, y0 = rng.uniform(0, side), rng.uniform(0, side)
+        w, h = rng.uniform(10, 300), rng.uniform(8, 60)
+        coords = (x0, y0, x0 + w, y0 + h)
+        if integer:
+            coords = tuple(int(c) for c in coords)
+        boxes.append(box(*coords))
+    return boxes, eps
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--random", type=int, default=500, help="random layouts of each kind")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    mismatches = 0
+    for name, eps, boxes in FIXTURES:
+        same = group_boxes(boxes, eps) == dbscan_groups(boxes, eps)
+        mismatches += not same
+        print(f"{name:<26} {'ok' if same else 'MISMATCH'}")
+
+    rng = random.Random(args.seed)
+    for integer in (True, False):
+        t_new = t_old = 0.0
+        failed = 0
+        for _ in range(args.random):
+            boxes, eps = random_layout(rng, integer)
+            start = time.perf_counter()
+            new = group_boxes(boxes, eps)
+            t_new += time.perf_counter() - start
+            start = time.perf_counter()
+            old = dbscan_groups(boxes, eps)
+            t_old += time.perf_counter() - start
+            failed += new != old
+        mismatches += failed
+        kind = "integer" if integer else "float"
+        print(f"{args.random} random {kind} layouts: {failed} mismatches "
+              f"(DBSCAN {t_old:.2f}s, group_boxes {t_new:.2f}s)")
+
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
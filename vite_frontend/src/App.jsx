@@ -5,6 +5,7 @@ function App() {
   const [uploadError, setUploadError] = useState(null);
   const [files, setFiles] = useState([]);
   const [activeQuiz, setActiveQuiz] = useState(null);
+  const [documentIds, setDocumentIds] = useState([]);
   const [mcqAnswers, setMcqAnswers] = useState({});
   const [saqAnswers, setSaqAnswers] = useState({});
   const [loading, setLoading] = useState(false);
@@ -75,6 +76,8 @@ function App() {
       const saq = data.quiz.filter((q) => q.type === "SAQ");
 
       setActiveQuiz({ mcq, saq });
+      // Content ids of the uploads: the quiz is looked up by these on submit
+      setDocumentIds(data.document_ids || []);
       setMcqAnswers({});
       setSaqAnswers({});
       setStage("MCQ");
@@ -106,6 +109,7 @@ function App() {
   const submitUserQuiz = async () => {
     const payload = {
       pdf_names: files.map((f) => f.name),
+      document_ids: documentIds,
       mcq_answers: mcqAnswers,
       saq_answers: saqAnswers,
     };
@@ -146,6 +150,7 @@ function App() {
     setMcqAnswers({});
     setSaqAnswers({});
     setActiveQuiz(null);
+    setDocumentIds([]);
     setSubmissionResult(null);
     setUploadError(null);
     setStage("UPLOAD");